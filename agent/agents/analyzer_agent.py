@@ -6,10 +6,10 @@ def analyzer_node(state: AgentState):
     print("--- Analyzer Agent: Analyzing trends and sentiment ---")
     summaries = state.get("summaries", [])
     language = state.get("language", "Korean")
-    combined_summaries = "\n\n".join(summaries)
+    combined_summaries = "\n\n".join(f"{s['title']}\n" + "\n".join(f"- {p}" for p in s["summary"]) for s in summaries)
     
     analysis_result = ""
-    llm = get_llm()
+    llm = get_llm("analyze")
     
     if llm and combined_summaries:
         prompt = f"""
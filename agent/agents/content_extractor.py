@@ -2,11 +2,15 @@ from agent.state import AgentState
 from agent.utils.tools import fetch_web_content, fetch_youtube_transcript
 
 import asyncio
-import aiohttp
+from contextlib import aclosing
 from agent.state import AgentState
-from agent.utils.async_tools import fetch_web_content_async, fetch_youtube_transcript
+from agent.utils.async_tools import fetch_youtube_transcript_async
+from agent.utils.page_cache import fetch_page_cached, page_cache
+from agent.utils.http_client import get_http_session
+from agent.utils.dedup import Deduper
+from agent.utils.deadline import extraction_deadline, time_left
 
-async def process_item(session, item):
+async def process_item(session, item, deadline=None):
     """
     Process a single search result item.
     """
@@ -18,14 +22,14 @@ async def process_item(session, item):
     # Try fetching full content
     try:
         if source_type in ["web", "community"]: 
-            fetched_data = await fetch_web_content_async(session, item.get("url"))
+            fetched_data = await fetch_page_cached(session, item.get("url"), deadline)
             if fetched_data:
                 content_data = fetched_data.get("text")
                 if fetched_data.get("thumbnail"): thumbnail = fetched_data.get("thumbnail")
                 if fetched_data.get("description"): description = fetched_data.get("description")
                 
         elif source_type == "youtube":
-            content_data = await asyncio.to_thread(fetch_youtube_transcript, item.get("video_id"))
+            content_data = await fetch_youtube_transcript_async(item.get("video_id"))
     except Exception as e:
         print(f"Extraction error for {item.get('url')}: {e}")
 
@@ -46,38 +50,80 @@ async def process_item(session, item):
         }
     return None
 
+DEFAULT_EXTRACT_CONCURRENCY = 5
+
+async def iter_extracted(session, results, target_count, concurrency=DEFAULT_EXTRACT_CONCURRENCY, deadline=None, deduper=None):
+    """
+    Bounded-concurrency work queue over ranked search results.
+    Slots are refilled in ranking order as soon as one frees up, and
+    yields (rank, content) for each successful extraction.
+    Near-duplicates of an already extracted item are folded into it by the
+    deduper and don't count toward target_count.
+    Remaining in-flight fetches are cancelled once target_count is reached,
+    when the consumer stops iterating, or when the extraction share of the job
+    deadline runs out (the rest of the job then works with what was found).
+    """
+    concurrency = max(1, concurrency or DEFAULT_EXTRACT_CONCURRENCY)
+    if deduper is None:
+        deduper = Deduper()
+    # Leave time for summarization: fetches are bounded by the extraction deadline, not the job's
+    deadline = extraction_deadline(deadline)
+    queue = iter(enumerate(results))
+    in_flight = {}
+    found = 0
+
+    def fill_slots():
+        while len(in_flight) < concurrency:
+            try:
+                rank, item = next(queue)
+            except StopIteration:
+                return
+            task = asyncio.create_task(process_item(session, item, deadline))
+            in_flight[task] = rank
+
+    try:
+        fill_slots()
+        while in_flight and found < target_count:
+            done, _ = await asyncio.wait(in_flight, timeout=time_left(deadline), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                print(f"--- Extractor: Deadline reached with {found}/{target_count} items ---")
+                break
+            for task in done:
+                rank = in_flight.pop(task)
+                res = task.result()
+                if res and found < target_count and deduper.add(rank, res):
+                    found += 1
+                    yield rank, res
+            if found < target_count:
+                fill_slots()
+    finally:
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            print(f"--- Extractor: Cancelled {len(in_flight)} in-flight fetches ---")
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
 async def content_extractor_async(state: AgentState):
     print("--- Content Extractor Agent: Fetching content (Async) ---")
     results = state.get("search_results", [])
     target_count = state.get("target_count", 5)
-    contents = []
-    
-    # Process in batches of 5 to respect rate limits and allow early exit
-    batch_size = 5
+    concurrency = state.get("extract_concurrency", DEFAULT_EXTRACT_CONCURRENCY)
+    ranked_contents = []
+    deduper = Deduper()
     
-    async with aiohttp.ClientSession() as session:
-        for i in range(0, len(results), batch_size):
-            # Check if we have enough
-            if len(contents) >= target_count:
-                break
-                
-            batch = results[i : i + batch_size]
-            print(f"--- Extractor: Processing batch {i//batch_size + 1} (Items {i+1}-{i+len(batch)})... ---")
-            
-            tasks = [process_item(session, item) for item in batch]
-            batch_results = await asyncio.gather(*tasks)
-            
-            for res in batch_results:
-                if res:
-                    contents.append(res)
-                    if len(contents) >= target_count:
-                        break
-            
-            print(f"--- Extractor: Currently have {len(contents)}/{target_count} items ---")
+    # Borrow the process-wide pooled session (keep-alive / DNS cache shared across jobs)
+    session = get_http_session()
+    async with aclosing(iter_extracted(session, results, target_count, concurrency, state.get("deadline"), deduper)) as extracted:
+        async for rank, res in extracted:
+            ranked_contents.append((rank, res))
+            print(f"--- Extractor: Currently have {len(ranked_contents)}/{target_count} items (rank {rank+1}) ---")
+
+    # Keep ranking order regardless of completion order (a record may have taken over a better-ranked duplicate's slot)
+    ranked_contents.sort(key=lambda x: deduper.rank_of(x[1], x[0]))
+    contents = [res for _, res in ranked_contents]
 
-    print(f"--- Extractor: Finished with {len(contents)} items ---")
+    print(f"--- Extractor: Finished with {len(contents)} items, {deduper.collapsed} duplicates collapsed (page cache: {page_cache.stats()}) ---")
     return {"contents": contents}
 
-def content_extractor_node(state: AgentState):
-    # Wrapper to run async function in sync graph
-    return asyncio.run(content_extractor_async(state))
+async def content_extractor_node(state: AgentState):
+    return await content_extractor_async(state)
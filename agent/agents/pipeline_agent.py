@@ -0,0 +1,76 @@
+import asyncio
+from contextlib import aclosing
+from agent.state import AgentState
+from agent.agents.content_extractor import iter_extracted, DEFAULT_EXTRACT_CONCURRENCY
+from agent.agents.summarization_agent import summarize_item, refresh_summary_source
+from agent.agents.report_generator import ReportBuilder
+from agent.utils.http_client import get_http_session
+from agent.utils.llm import get_llm
+from agent.utils.llm_scheduler import PRIORITY_BATCH
+from agent.utils.dedup import Deduper
+from agent.utils.deadline import gather_until, time_left, DEADLINE_REPORT_RESERVE
+
+async def pipeline_async(state: AgentState):
+    """
+    Streaming extract -> summarize -> report.
+    Each content item is handed to summarize_item as soon as extraction returns it,
+    and the report builder consumes summaries as they complete, so network fetches
+    overlap with LLM latency instead of waiting on a stage barrier.
+    """
+    print("--- Pipeline Agent: Streaming extract -> summarize (Async) ---")
+    query = state.get("query", "Unknown Query")
+    results = state.get("search_results", [])
+    target_count = state.get("target_count", 5)
+    concurrency = state.get("extract_concurrency", DEFAULT_EXTRACT_CONCURRENCY)
+    language = state.get("language", "Korean")
+    output_format = state.get("format", "markdown")
+    priority = state.get("priority", PRIORITY_BATCH)
+
+    llm = get_llm("summarize")
+    builder = ReportBuilder(query, output_format)
+    ranked_contents = []
+    ranked_summaries = []
+    summary_tasks = []
+    deduper = Deduper()
+
+    async def summarize_ranked(rank, content):
+        summary = await summarize_item(llm, content, language, priority, query)
+        if summary is not None:
+            ranked_summaries.append((content, summary))
+            builder.add(summary, deduper.rank_of(content, rank))
+            print(f"--- Pipeline: Summarized rank {rank+1} ({len(ranked_summaries)} done) ---")
+
+    session = get_http_session()
+    try:
+        async with aclosing(iter_extracted(session, results, target_count, concurrency, state.get("deadline"), deduper)) as extracted:
+            async for rank, content in extracted:
+                ranked_contents.append((rank, content))
+                summary_tasks.append(asyncio.create_task(summarize_ranked(rank, content)))
+        # Near the job deadline, unfinished summaries are cancelled; the report has the rest
+        await gather_until(summary_tasks, time_left(state.get("deadline"), DEADLINE_REPORT_RESERVE))
+        unfinished = sum(1 for task in summary_tasks if task.cancelled())
+        if unfinished:
+            print(f"--- Pipeline: Deadline reached, {unfinished} summaries unfinished ---")
+    finally:
+        for task in summary_tasks:
+            task.cancel()
+
+    # A better-ranked duplicate may have taken over a content after its summary was built
+    for content, summary in ranked_summaries:
+        if refresh_summary_source(summary, content):
+            builder.rerank(summary, deduper.rank_of(content))
+            print(f"--- Pipeline: Summary re-pointed to {summary['source']} (better-ranked duplicate) ---")
+
+    # Stage results still land in AgentState in ranking order
+    ranked_contents.sort(key=lambda x: deduper.rank_of(x[1], x[0]))
+    ranked_summaries.sort(key=lambda x: deduper.rank_of(x[0]))
+
+    print(f"--- Pipeline: Finished with {len(ranked_contents)} contents, {len(ranked_summaries)} summaries ---")
+    return {
+        "contents": [c for _, c in ranked_contents],
+        "summaries": [s for _, s in ranked_summaries],
+        "report": builder.render()
+    }
+
+async def pipeline_node(state: AgentState):
+    return await pipeline_async(state)
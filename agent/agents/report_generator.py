@@ -1,48 +1,57 @@
 import json
-from collections import defaultdict
-from agent.state import AgentState
+from agent.state import AgentState, SummaryRecord
+
+class ReportBuilder:
+    """
+    Incrementally assembles the report.
+    Summaries can be added as soon as they are produced (e.g. by the pipeline node);
+    render() orders them by rank when one was given.
+    """
+    def __init__(self, query: str, output_format: str = "markdown"):
+        self.query = query
+        self.output_format = output_format
+        self._items = []
+
+    def add(self, summary: SummaryRecord, rank=None):
+        item = summary
+        if not isinstance(item, dict):
+            # Fallback for plain-text summaries
+            item = {"title": "Unknown", "summary": [str(summary)], "category": "Uncategorized", "source": "", "thumbnail": ""}
+        order = rank if rank is not None else len(self._items)
+        self._items.append((order, len(self._items), item))
+
+    def rerank(self, summary: SummaryRecord, rank):
+        """
+        Move an already added summary to a new rank (its source was replaced by a better-ranked copy).
+        """
+        self._items = [(rank if item is summary else order, seq, item) for order, seq, item in self._items]
+
+    @property
+    def items(self):
+        return [item for _, _, item in sorted(self._items, key=lambda x: (x[0], x[1]))]
+
+    def render(self) -> str:
+        parsed_summaries = self.items
+
+        if self.output_format == "json":
+            report_data = {
+                "query": self.query,
+                "source_summaries": parsed_summaries # Flat list with categories
+                # Or structured: "categories": {cat: [items]}
+            }
+            return json.dumps(report_data, ensure_ascii=False, indent=2)
 
-def report_generator_node(state: AgentState):
-    print("--- Report Generator Agent: Compiling report ---")
-    query = state.get("query", "Unknown Query")
-    summaries = state.get("summaries", [])
-    output_format = state.get("format", "markdown")
-    
-    # Parse summaries
-    parsed_summaries = []
-    for s in summaries:
-        try:
-            parsed_summaries.append(json.loads(s))
-        except:
-            # Fallback for old string format or errors
-            parsed_summaries.append({"title": "Unknown", "summary": [s], "category": "Uncategorized", "source": "", "thumbnail": ""})
-            
-    # Group by Category
-    grouped = defaultdict(list)
-    for item in parsed_summaries:
-        cat = item.get("category", "General")
-        grouped[cat].append(item)
-    
-    if output_format == "json":
-        report_data = {
-            "query": query,
-            "source_summaries": parsed_summaries # Flat list with categories
-            # Or structured: "categories": {cat: [items]}
-        }
-        return {"report": json.dumps(report_data, ensure_ascii=False, indent=2)}
-    
-    else:
         # Markdown generation (Flat list, no categories)
-        report = f"# Research Report: {query}\n\n"
-        
+        report = f"# Research Report: {self.query}\n\n"
+
         for item in parsed_summaries:
             title = item.get("title")
             url = item.get("source")
             thumbnail = item.get("thumbnail")
             points = item.get("summary", [])
-            
+
             report += f"### {title}\n\n"
-            
+
             # Summary points first
             if isinstance(points, list):
                 for point in points:
@@ -50,16 +59,31 @@ def report_generator_node(state: AgentState):
             else:
                 report += f"{points}\n"
             report += "\n"
-            
+
             # Source URL and Date
             if url:
                 date_str = f" ({item.get('date')})" if item.get('date') else ""
                 report += f"**출처**: [{url}]({url}){date_str}\n\n"
-            
+                alternates = item.get("alternate_urls") or []
+                if alternates:
+                    report += "**다른 출처**: " + ", ".join(f"[{u}]({u})" for u in alternates) + "\n\n"
+
             # Thumbnail
             if thumbnail:
                 report += f"![thumbnail]({thumbnail})\n\n"
-            
+
             report += "---\n\n"
-            
-        return {"report": report}
+
+        return report
+
+async def report_generator_node(state: AgentState):
+    print("--- Report Generator Agent: Compiling report ---")
+    query = state.get("query", "Unknown Query")
+    summaries = state.get("summaries", [])
+    output_format = state.get("format", "markdown")
+
+    builder = ReportBuilder(query, output_format)
+    for s in summaries:
+        builder.add(s)
+
+    return {"report": builder.render()}
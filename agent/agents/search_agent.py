@@ -1,29 +1,47 @@
 from agent.state import AgentState
-from agent.utils.tools import tavily_search, youtube_search
-from agent.utils.ranker import rank_results
+from agent.utils.search_sources import search_all
+from agent.utils.search_cache import cached_search, search_cache
+from agent.utils.ranker import rank_results, RANK_FALLBACK_CACHE_TTL
+from agent.utils.llm_scheduler import PRIORITY_BATCH
+from agent.utils.deadline import search_deadline
 
-def search_node(state: AgentState):
+async def search_and_rank(query: str, date_range, priority: int = PRIORITY_BATCH, deadline=None):
+    # Fan out to every registered source concurrently
+    # (Broad Web/Community via Tavily: 20 items, YouTube: 10 items)
+    results_by_source = await search_all(query, date_range, deadline=deadline)
+
+    # Combined results (total ~30 candidates)
+    all_results = [res for results in results_by_source.values() for res in results]
+
+    counts = ", ".join(f"{name}: {len(results)}" for name, results in results_by_source.items())
+    print(f"--- Search Agent: Reranking {len(all_results)} results ({counts}) ---")
+
+    # Rerank and keep top 20 to pass to extractor; returns (results, fell_back)
+    return await rank_results(query, all_results, top_k=20, priority=priority, deadline=deadline)
+
+async def search_node(state: AgentState):
     query = state.get("query", "")
     date_range = state.get("date_range", {})
-    
+    priority = state.get("priority", PRIORITY_BATCH)
+    # Search and rerank only get a share of the job's time; a rerank that wouldn't fit falls back to lexical order
+    deadline = search_deadline(state.get("deadline"))
+
     print(f"--- Search Agent: Searching for '{query}' with range {date_range} ---")
-    
-    # Fetch ample results to ensure we can meet target_count even with failures
-    # Broad Web/Community Search (20 items)
-    web_results = tavily_search(query, max_results=20, date_range=date_range)
-    
-    # YouTube Search (10 items)
-    yt_results = youtube_search(query, max_results=10, date_range=date_range)
-    
-    # Combined results (total ~30 candidates)
-    all_results = web_results + yt_results
-    
-    print(f"--- Search Agent: Reranking {len(all_results)} results (Web/Comm: {len(web_results)}, YT: {len(yt_results)}) ---")
-    
-    # Rerank and keep top 20 to pass to extractor
-    ranked_results = rank_results(query, all_results, top_k=20)
-    
+
+    fell_back = False
+
+    async def fetch():
+        nonlocal fell_back
+        results, fell_back = await search_and_rank(query, date_range, priority, deadline)
+        return results
+
+    # Repeated queries within the freshness window skip search and rerank entirely;
+    # a lexical fallback (LLM rerank failed or timed out) is only kept briefly
+    ranked_results = await cached_search(query, date_range, "reranked", fetch,
+                                         ttl_of=lambda _: RANK_FALLBACK_CACHE_TTL if fell_back else None)
+
     for i, res in enumerate(ranked_results):
         print(f"  - [{i+1}] [{res.get('relevance_score')}/10] {res.get('title')} ({res.get('source')})")
-            
+
+    print(f"--- Search Agent: search cache {search_cache.stats()} ---")
     return {"search_results": ranked_results}
@@ -2,44 +2,168 @@ from agent.state import AgentState
 from agent.utils.llm import get_llm
 from langchain_core.messages import SystemMessage, HumanMessage
 
-import json
+import os
 import asyncio
-import re
-from agent.state import AgentState
-from agent.utils.llm import get_llm
+import hashlib
+from collections import Counter
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from agent.state import AgentState, SummaryRecord
+from agent.utils.llm import get_llm, structured_llm
+from agent.utils.cache import SqliteCache
+from agent.utils.llm_scheduler import llm_dispatcher, estimate_text_tokens, PRIORITY_BATCH
+from agent.utils.chunking import split_chunks, select_chunks
+from agent.utils.deadline import gather_until, time_left, DEADLINE_REPORT_RESERVE
 from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.callbacks import adispatch_custom_event
+
+# Bump whenever the summarization prompt changes so cached summaries are not reused
+SUMMARY_PROMPT_VERSION = "3"
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", str(30 * 24 * 60 * 60))) # 30 days
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "20000"))
+
+summary_cache = SqliteCache("summaries", ttl=SUMMARY_CACHE_TTL, max_entries=SUMMARY_CACHE_MAX_ENTRIES)
+
+# Batching: items up to SUMMARY_BATCH_ITEM_CHARS (snippet fallbacks, short posts) are packed
+# several to a request, up to SUMMARY_BATCH_TOKEN_BUDGET prompt tokens / SUMMARY_BATCH_MAX_ITEMS documents
+SUMMARY_BATCH_ITEM_CHARS = int(os.getenv("SUMMARY_BATCH_ITEM_CHARS", "1500"))
+SUMMARY_BATCH_TOKEN_BUDGET = int(os.getenv("SUMMARY_BATCH_TOKEN_BUDGET", "3000"))
+SUMMARY_BATCH_MAX_ITEMS = int(os.getenv("SUMMARY_BATCH_MAX_ITEMS", "6"))
 
-def clean_json_string(content_str: str) -> str:
+# Map-reduce: content longer than SUMMARY_DIRECT_CHARS is split into SUMMARY_CHUNK_CHARS chunks;
+# up to SUMMARY_MAX_CHUNKS of them are summarized in parallel, then the partial notes are reduced
+SUMMARY_DIRECT_CHARS = int(os.getenv("SUMMARY_DIRECT_CHARS", "5000"))
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "4000"))
+SUMMARY_MAX_CHUNKS = int(os.getenv("SUMMARY_MAX_CHUNKS", "6"))
+
+def summary_cache_key(text: str, language: str, llm) -> str:
     """
-    Attempt to clean up common JSON formatting errors from LLM output.
+    Content-addressed key: hash of the text sent to the LLM plus everything else that shapes the output.
     """
-    content_str = content_str.strip()
-    
-    # Remove markdown code blocks
-    if content_str.startswith("```json"):
-        content_str = content_str[7:]
-    if content_str.endswith("```"):
-        content_str = content_str[:-3]
-    if content_str.startswith("```"):
-        content_str = content_str[3:]
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{digest}:{language}:{model}:v{SUMMARY_PROMPT_VERSION}"
+
+class SummaryOutput(BaseModel):
+    """
+    Structured output schema for one summarized document.
+    """
+    points: List[str] = Field(description="3 to 5 key points, each a distinct sentence")
+    category: str = Field(description='Content category, e.g. "Concept", "News", "Tutorial", "Industry Case", "Opinion", "Tool"')
+
+class BatchSummaryEntry(SummaryOutput):
+    id: int = Field(description="The document id")
+
+class BatchSummaryOutput(BaseModel):
+    """
+    Structured output schema for a batch: one entry per document.
+    """
+    results: List[BatchSummaryEntry]
+
+async def emit_summary(record: SummaryRecord):
+    """
+    Surface a finished summary to astream_events consumers as a "summary" custom event.
+    """
+    try:
+        await adispatch_custom_event("summary", record)
+    except RuntimeError:
+        pass # Not running inside a graph/runnable (e.g. called directly)
+
+def build_summary_result(content, summary_data, category) -> SummaryRecord:
+    return {
+        "title": content.get("title", "No Title"),
+        "summary": summary_data,
+        "category": category,
+        "source": content.get("url", "N/A"),
+        "date": content.get("published_date", ""),
+        "thumbnail": content.get("thumbnail", ""),
+        "alternate_urls": content.get("alternate_urls", [])
+    }
+
+def refresh_summary_source(record: SummaryRecord, content) -> bool:
+    """
+    Re-point a summary at its content's current source after a dedup takeover
+    (a better-ranked duplicate replaced the content once it had been summarized).
+    Returns True if the record changed.
+    """
+    url = content.get("url", "N/A")
+    if record.get("source") == url and record.get("alternate_urls", []) == content.get("alternate_urls", []):
+        return False
+    fresh = build_summary_result(content, record.get("summary"), record.get("category"))
+    record.update(title=fresh["title"], source=fresh["source"], date=fresh["date"], thumbnail=fresh["thumbnail"] or record.get("thumbnail", ""), alternate_urls=fresh["alternate_urls"])
+    return True
+
+def long_source(text: str, query: str = ""):
+    """
+    Split long content and pre-select the chunks worth summarizing (select_chunks depends
+    on the query). Returns (chunk_count, selected, source_text); source_text is exactly
+    what the map step sees, so it is what the summary is cached on.
+    """
+    chunks = split_chunks(text, SUMMARY_CHUNK_CHARS)
+    selected = select_chunks(chunks, query, SUMMARY_MAX_CHUNKS)
+    source_text = "\n".join(f"[{i+1}/{len(chunks)}] {chunk}" for i, chunk in selected)
+    return len(chunks), selected, source_text
+
+async def summarize_long(llm, chunk_count, selected, language, priority=PRIORITY_BATCH):
+    """
+    Map-reduce summary for content too long for one prompt.
+    The chunks pre-selected by long_source are summarized in parallel through
+    llm_dispatcher, and the partial notes are reduced into the final points.
+    Returns (points, category, clean); clean is False when the reduce step had to be skipped.
+    """
+    print(f"--- Summarization Agent: Map-reduce over {len(selected)}/{chunk_count} chunks ---")
+    system = SystemMessage(content=f"You are a helpful research assistant. You MUST output ONLY in {language}.")
+
+    async def map_chunk(i, chunk):
+        prompt = f"""
+        Task: Extract the key points of part {i+1} of {chunk_count} of a longer document, in {language}.
         
-    content_str = content_str.strip()
-    
-    # Sometimes LLM outputs text before or after JSON, try to find the JSON object/array
-    # Find first '{' and last '}'
-    start = content_str.find("{")
-    end = content_str.rfind("}")
-    if start != -1 and end != -1:
-        content_str = content_str[start:end+1]
+        Requirements:
+        1. LANGUAGE: The points MUST be written in {language} ONLY.
+        2. POINTS: Provide 2 to 4 key points as distinct sentences. Skip navigation, ads and boilerplate.
+        3. TERMS: If technical terms are used, include the original English term in parentheses (e.g., "생성형 AI (Generative AI)").
+        4. CATEGORY: Assign a category to the document as a whole (e.g., "Concept", "News", "Tutorial", "Industry Case", "Opinion", "Tool").
         
-    return content_str
+        Content:
+        {chunk}
+        """
+        response = await llm_dispatcher.ainvoke(structured_llm(llm, SummaryOutput), [system, HumanMessage(content=prompt)], priority)
+        return response["parsed"]
+
+    mapped = await asyncio.gather(*[map_chunk(i, chunk) for i, chunk in selected], return_exceptions=True)
+    partials = [(i, m) for (i, _), m in zip(selected, mapped) if isinstance(m, SummaryOutput) and m.points]
+    if not partials:
+        errors = [m for m in mapped if isinstance(m, Exception)]
+        raise errors[0] if errors else ValueError("no chunk could be summarized")
+    top_category = Counter(m.category for _, m in partials if m.category).most_common(1)
+    category = top_category[0][0] if top_category else "General"
 
-async def summarize_item(llm, content, language, output_format):
+    notes = "\n".join(f"[Part {i+1}] " + " ".join(m.points) for i, m in partials)
+    prompt = f"""
+        Task: The notes below summarize parts of one document. Combine them into a single summary in {language}.
+        
+        Requirements:
+        1. LANGUAGE: The summary MUST be written in {language} ONLY. Do not use any other language for the summary text itself.
+        2. POINTS: Provide 3 to 5 key points as distinct sentences, covering the whole document rather than only its first part.
+        3. TERMS: Keep the original English term in parentheses for technical terms (e.g., "생성형 AI (Generative AI)").
+        4. CATEGORY: Assign a category to this content (e.g., "Concept", "News", "Tutorial", "Industry Case", "Opinion", "Tool").
+        
+        Notes:
+        {notes}
+        """
+    try:
+        response = await llm_dispatcher.ainvoke(structured_llm(llm, SummaryOutput), [system, HumanMessage(content=prompt)], priority)
+        parsed = response["parsed"]
+        if parsed and parsed.points:
+            return parsed.points, parsed.category or category, True
+    except Exception as e:
+        print(f"Reduce step failed: {e}")
+    # Reduce failed: lead point of each part
+    return [m.points[0] for _, m in partials][:5], category, False
+
+async def summarize_item(llm, content, language, priority=PRIORITY_BATCH, query="") -> Optional[SummaryRecord]:
     text = content.get("content", "")
     url = content.get("url", "N/A")
-    title = content.get("title", "No Title")
-    thumbnail = content.get("thumbnail", "")
-    description = content.get("description", "")
     
     if not text:
         return None
@@ -47,8 +171,27 @@ async def summarize_item(llm, content, language, output_format):
     summary_data = []
     category = "General"
     
-    if llm:
-        # Ask LLM to return a JSON array of sentences AND a category
+    # Long content goes through map-reduce, keyed on the chunks selected for this query
+    long_content = len(text) > SUMMARY_DIRECT_CHARS and llm is not None
+    if long_content:
+        chunk_count, selected, source_text = long_source(text, query)
+    else:
+        source_text = text[:SUMMARY_DIRECT_CHARS]
+    cache_key = summary_cache_key(source_text, language, llm) if llm else None
+    cached = summary_cache.get(cache_key) if cache_key else None
+
+    if cached:
+        # Same content/language/model/prompt seen before: skip the LLM call
+        summary_data = cached.get("points", [])
+        category = cached.get("category", "General")
+    elif long_content:
+        try:
+            summary_data, category, clean = await summarize_long(llm, chunk_count, selected, language, priority)
+            if clean:
+                await summary_cache.aset(cache_key, {"points": summary_data, "category": category})
+        except Exception as e:
+            summary_data = [f"Error generating summary: {e}"]
+    elif llm:
         prompt = f"""
         Task: Summarize the following content in {language}.
         
@@ -58,106 +201,155 @@ async def summarize_item(llm, content, language, output_format):
         3. TERMS: If technical terms are used, include the original English term in parentheses (e.g., "생성형 AI (Generative AI)").
         4. CATEGORY: Assign a category to this content (e.g., "Concept", "News", "Tutorial", "Industry Case", "Opinion", "Tool").
         
-        Format the output strictly as a JSON object with keys:
-        - "points": [list of strings]
-        - "category": "string"
-        
         Content:
-        {text[:5000]} 
+        {source_text} 
         """
         try:
-            response = await llm.ainvoke([SystemMessage(content=f"You are a helpful research assistant. You MUST output ONLY in {language}."), HumanMessage(content=prompt)])
-            content_str = clean_json_string(response.content)
-            
-            try:
-                parsed = json.loads(content_str)
-            except json.JSONDecodeError:
-                print(f"JSON Parse Error for {url}. Attempting recovery...")
-                # Recovery Strategy 1: Regex extraction
-                try:
-                    points_match = re.search(r'"points":\s*\[(.*?)\]', content_str, re.DOTALL)
-                    category_match = re.search(r'"category":\s*"([^"]+)"', content_str)
-                    
-                    if points_match:
-                        # Try to parse just the list part
-                        points_str = f"[{points_match.group(1)}]"
-                        # Fix common trailing comma issue like ["a", "b",]
-                        points_str = re.sub(r',\s*\]', ']', points_str)
-                        summary_data = json.loads(points_str)
-                    
-                    if category_match:
-                        category = category_match.group(1)
-                        
-                    if not summary_data:
-                         raise ValueError("Regex failed")
-                         
-                except Exception as e:
-                    # Recovery Strategy 2: Fallback to raw text
-                    # If completely broken, just treat the whole content as one summary point (cleaned up)
-                    print(f"Recovery failed: {e}. Using raw text.")
-                    raw_text = response.content.strip()
-                    # Remove markdown blocks if still present
-                    if raw_text.startswith("```"): raw_text = raw_text.split("\n", 1)[-1]
-                    if raw_text.endswith("```"): raw_text = raw_text.rsplit("\n", 1)[0]
-                    
-                    summary_data = [raw_text]
-                    category = "Uncategorized"
-            
-            if not summary_data and parsed:
-                 summary_data = parsed.get("points", [])
-                 category = parsed.get("category", "General")
-            
-            if not isinstance(summary_data, list):
-                if summary_data:
-                    summary_data = [str(summary_data)]
-                else:
-                    summary_data = ["Summary generation failed."]
+            response = await llm_dispatcher.ainvoke(structured_llm(llm, SummaryOutput), [SystemMessage(content=f"You are a helpful research assistant. You MUST output ONLY in {language}."), HumanMessage(content=prompt)], priority)
+            parsed = response["parsed"]
+            if parsed and parsed.points:
+                summary_data = parsed.points
+                category = parsed.category or "General"
+                await summary_cache.aset(cache_key, {"points": summary_data, "category": category})
+            else:
+                # Schema violation: keep whatever text came back rather than re-asking
+                print(f"Structured output failed for {url}: {response['parsing_error']}")
+                raw_text = response["raw"].content.strip() if response["raw"].content else ""
+                summary_data = [raw_text] if raw_text else ["Summary generation failed."]
+                category = "Uncategorized"
                 
         except Exception as e:
             summary_data = [f"Error generating summary: {e}"]
     else:
          summary_data = [f"(Mock Summary) {text[:200]}..."]
 
-    date = content.get("published_date", "")
+    record = build_summary_result(content, summary_data, category)
+    await emit_summary(record)
+    return record
 
-    # Construct result object (without description)
-    result_obj = {
-        "title": title,
-        "summary": summary_data,
-        "category": category,
-        "source": url,
-        "date": date,
-        "thumbnail": thumbnail
-    }
-
-    # Return object directly (don't json dump yet if we want to process it later)
-    # But current architecture passes strings. Let's dump to string but include category.
-    if output_format == "json":
-        return json.dumps(result_obj, ensure_ascii=False)
+def pack_summary_batches(contents):
+    """
+    Greedily pack short content items into batches under the token budget.
+    Returns (batches, singles): lists of indices into contents.
+    """
+    batches, singles = [], []
+    current, current_tokens = [], 0
+    for i, content in enumerate(contents):
+        text = content.get("content", "")
+        if not text:
+            continue
+        if len(text) > SUMMARY_BATCH_ITEM_CHARS:
+            singles.append(i)
+            continue
+        tokens = estimate_text_tokens(text)
+        if current and (current_tokens + tokens > SUMMARY_BATCH_TOKEN_BUDGET or len(current) >= SUMMARY_BATCH_MAX_ITEMS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if len(current) > 1:
+        batches.append(current)
     else:
-        # Markdown formatting - simplified, report generator will handle grouping if possible.
-        # But wait, Summarization node returns list of strings.
-        # Report generator needs structured data to group by category.
-        # We should return the JSON string representation and let Report Generator parse it.
-        return json.dumps(result_obj, ensure_ascii=False) # Always return JSON string internally for consistency
+        singles.extend(current)
+    return batches, singles
 
+async def summarize_batch(llm, contents, language, priority=PRIORITY_BATCH) -> List[Optional[SummaryRecord]]:
+    """
+    Summarize several short documents in one LLM request.
+    Returns results aligned with contents; documents that come back missing or
+    malformed (or the whole call failing) fall back to single-item summarize_item calls.
+    """
+    results = [None] * len(contents)
+    pending = []
+    for i, content in enumerate(contents):
+        cached = summary_cache.get(summary_cache_key(content["content"][:SUMMARY_DIRECT_CHARS], language, llm))
+        if cached:
+            results[i] = build_summary_result(content, cached.get("points", []), cached.get("category", "General"))
+            await emit_summary(results[i])
+        else:
+            pending.append(i)
+
+    if len(pending) > 1:
+        documents = "\n".join(f'<document id="{i}">\n{contents[i]["content"]}\n</document>' for i in pending)
+        prompt = f"""
+        Task: Summarize EACH of the following documents in {language}, independently of each other.
+        
+        Requirements (per document):
+        1. LANGUAGE: The summary MUST be written in {language} ONLY. Do not use any other language for the summary text itself.
+        2. POINTS: Provide 3 to 5 key points as distinct sentences.
+        3. TERMS: If technical terms are used, include the original English term in parentheses (e.g., "생성형 AI (Generative AI)").
+        4. CATEGORY: Assign a category to this content (e.g., "Concept", "News", "Tutorial", "Industry Case", "Opinion", "Tool").
+        5. Return exactly one result per document, tagged with its document id.
+        
+        Documents:
+        {documents}
+        """
+        try:
+            response = await llm_dispatcher.ainvoke(structured_llm(llm, BatchSummaryOutput), [SystemMessage(content=f"You are a helpful research assistant. You MUST output ONLY in {language}."), HumanMessage(content=prompt)], priority)
+            parsed = response["parsed"]
+            if parsed is None:
+                raise ValueError(response["parsing_error"])
+            for entry in parsed.results:
+                i = entry.id
+                if i not in pending or results[i] is not None or not entry.points:
+                    continue
+                category = entry.category or "General"
+                await summary_cache.aset(summary_cache_key(contents[i]["content"][:SUMMARY_DIRECT_CHARS], language, llm), {"points": entry.points, "category": category})
+                results[i] = build_summary_result(contents[i], entry.points, category)
+                await emit_summary(results[i])
+        except Exception as e:
+            print(f"Batch summary failed ({len(pending)} items): {e}. Falling back to single calls.")
+
+    missing = [i for i in pending if results[i] is None]
+    if missing:
+        if len(pending) > 1:
+            print(f"--- Summarization Agent: {len(missing)}/{len(pending)} batched items fall back to single calls ---")
+        singles = await asyncio.gather(*[summarize_item(llm, contents[i], language, priority) for i in missing])
+        for i, result in zip(missing, singles):
+            results[i] = result
+    return results
 
 async def summarization_async(state: AgentState):
     print("--- Summarization Agent: Summarizing content (Async) ---")
+    query = state.get("query", "")
     contents = state.get("contents", [])
     language = state.get("language", "Korean")
-    output_format = state.get("format", "markdown")
     
-    llm = get_llm()
+    priority = state.get("priority", PRIORITY_BATCH)
+    
+    llm = get_llm("summarize")
+    
+    # Short items share requests; everything else gets its own call
+    if llm and state.get("batch_summaries", True):
+        batches, singles = pack_summary_batches(contents)
+    else:
+        batches, singles = [], list(range(len(contents)))
+    if batches:
+        print(f"--- Summarization Agent: {sum(len(b) for b in batches)} short items in {len(batches)} batches, {len(singles)} single ---")
+    
+    # Items are submitted together; llm_dispatcher bounds how many calls actually run
+    async def run_single(i):
+        return [(i, await summarize_item(llm, contents[i], language, priority, query))]
+    
+    async def run_batch(indices):
+        batch_results = await summarize_batch(llm, [contents[i] for i in indices], language, priority)
+        return list(zip(indices, batch_results))
     
-    # Process all items in parallel
-    tasks = [summarize_item(llm, content, language, output_format) for content in contents]
-    results = await asyncio.gather(*tasks)
+    tasks = [asyncio.create_task(run_batch(indices)) for indices in batches] + [asyncio.create_task(run_single(i)) for i in singles]
+    results = [None] * len(contents)
+    # Near the job deadline, unfinished items are cancelled and the report uses what is done
+    groups = await gather_until(tasks, time_left(state.get("deadline"), DEADLINE_REPORT_RESERVE))
+    if any(group is None for group in groups):
+        print(f"--- Summarization Agent: Deadline reached, dropped {sum(1 for g in groups if g is None)} unfinished requests ---")
+    for group in groups:
+        for i, result in group or []:
+            results[i] = result
     
     # Filter Nones
     summaries = [r for r in results if r is not None]
+    print(f"--- Summarization Agent: {len(summaries)} summaries (summary cache: {summary_cache.stats()}, llm: {llm_dispatcher.stats()}) ---")
          
     return {"summaries": summaries}
 
-def summarization_node(state: AgentState):
-    return asyncio.run(summarization_async(state))
+async def summarization_node(state: AgentState):
+    return await summarization_async(state)
@@ -1,3 +1,4 @@
+import asyncio
 from langgraph.graph import StateGraph, END
 from agent.state import AgentState
 from agent.agents.search_agent import search_node
@@ -5,6 +6,13 @@ from agent.agents.content_extractor import content_extractor_node
 from agent.agents.summarization_agent import summarization_node
 from agent.agents.analyzer_agent import analyzer_node
 from agent.agents.report_generator import report_generator_node
+from agent.agents.pipeline_agent import pipeline_node
+from agent.utils.http_client import init_http_session, close_http_session
+from agent.utils.usage import UsageTracker, track_usage
+
+def route_after_search(state: AgentState):
+    # Streaming pipeline overlaps extraction with summarization and assembles the report itself
+    return "pipeline" if state.get("pipeline") else "extract"
 
 def create_graph():
     workflow = StateGraph(AgentState)
@@ -13,18 +21,40 @@ def create_graph():
     workflow.add_node("search", search_node)
     workflow.add_node("extract", content_extractor_node)
     workflow.add_node("summarize", summarization_node)
+    workflow.add_node("pipeline", pipeline_node)
     # workflow.add_node("analyze", analyzer_node) # Removed
     workflow.add_node("report", report_generator_node)
     
     # Define Edges
     workflow.set_entry_point("search")
     
-    workflow.add_edge("search", "extract")
+    workflow.add_conditional_edges("search", route_after_search, {"extract": "extract", "pipeline": "pipeline"})
     workflow.add_edge("extract", "summarize")
     workflow.add_edge("summarize", "report") # Skip analyze
     # workflow.add_edge("analyze", "report") # Removed
     workflow.add_edge("report", END)
+    workflow.add_edge("pipeline", END)
     
     # Compile
     app = workflow.compile()
     return app
+
+def run_graph(inputs, app=None):
+    """
+    Sync facade for callers without an event loop (e.g. the CLI).
+    All nodes are coroutines, so the graph must be driven through ainvoke.
+    """
+    if app is None:
+        app = create_graph()
+
+    async def _run():
+        await init_http_session()
+        tracker = UsageTracker()
+        try:
+            with track_usage(tracker):
+                return await app.ainvoke(inputs, config={"callbacks": [tracker]})
+        finally:
+            print(f"--- Usage: {tracker.summary()} ---")
+            await close_http_session()
+
+    return asyncio.run(_run())
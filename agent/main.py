@@ -8,7 +8,7 @@ from dotenv import load_dotenv
 BASE_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(BASE_DIR))
 
-from agent.graph import create_graph
+from agent.graph import create_graph, run_graph
 from agent.utils.input_handler import create_graph_inputs
 
 # Load environment variables
@@ -34,6 +34,10 @@ def main():
     parser.add_argument("--startTime", type=str, default=default_start_time, help="Start time (HH:MM:SS)")
     parser.add_argument("--endTime", type=str, default=default_end_time, help="End time (HH:MM:SS)")
     parser.add_argument("--count", type=int, default=5, help="Target number of summaries (default: 5)")
+    parser.add_argument("--concurrency", type=int, default=5, help="Max concurrent content fetches (default: 5)")
+    parser.add_argument("--pipeline", action="store_true", help="Summarize each source as soon as it is extracted")
+    parser.add_argument("--no-batch", action="store_true", help="Summarize every item in its own LLM call")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds the research may take; the report uses what is done by then")
     
     args = parser.parse_args()
     
@@ -47,7 +51,11 @@ def main():
         end_date=args.endDate,
         start_time=args.startTime,
         end_time=args.endTime,
-        count=args.count
+        count=args.count,
+        concurrency=args.concurrency,
+        pipeline=args.pipeline,
+        batch_summaries=not args.no_batch,
+        timeout=args.timeout
     )
     
     print(f"Starting research for: {args.query}")
@@ -55,7 +63,7 @@ def main():
     print(f"Language: {args.lang}, Format: {args.format}")
     
     # Run the graph
-    result = app.invoke(inputs)
+    result = run_graph(inputs, app)
     
     # Output the report
     output_content = result.get("report")
@@ -1,5 +1,14 @@
 import operator
-from typing import TypedDict, Annotated, List, Dict, Any, Union
+from typing import TypedDict, Annotated, List, Dict, Any, Optional, Union
+
+class SummaryRecord(TypedDict):
+    title: str
+    summary: List[str] # Key points
+    category: str
+    source: str # URL
+    date: str
+    thumbnail: str
+    alternate_urls: List[str] # Near-duplicate sources collapsed into this one
 
 class AgentState(TypedDict):
     query: str
@@ -7,6 +16,12 @@ class AgentState(TypedDict):
     format: str # Output format (markdown or json)
     date_range: Dict[str, str] # {startDate, endDate, startTime, endTime}
     target_count: int # Target number of successful extractions
+    extract_concurrency: int # Max concurrent fetches in the extractor work queue
+    pipeline: bool # Stream each extracted item straight into summarization
+    timeout: Optional[float] # Seconds the job may run (queued jobs restart the clock when they start)
+    deadline: Optional[float] # Epoch seconds by which the job should finish (None = no deadline)
+    priority: int # LLM dispatch priority (0 = interactive/stream, 1 = batch)
+    batch_summaries: bool # Pack short items several to a summarization request
     
     # Deep Research
     depth: int # Current recursion depth (starts at 0)
@@ -14,7 +29,7 @@ class AgentState(TypedDict):
     
     search_results: Annotated[List[Dict[str, Any]], operator.add]
     contents: Annotated[List[Dict[str, Any]], operator.add]  # content from web or youtube transcript
-    summaries: Annotated[List[str], operator.add] # Stores formatted string blocks (for MD) or JSON strings
+    summaries: Annotated[List[SummaryRecord], operator.add] # Validated summary records
     
     analysis: str
     report: str
@@ -1,89 +1,210 @@
 import os
+import time
+import codecs
 import asyncio
 import aiohttp
-from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
-from tenacity import retry, stop_after_attempt, wait_fixed
-from youtube_transcript_api import YouTubeTranscriptApi
+from concurrent.futures import ThreadPoolExecutor
+from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound, VideoUnavailable
 from youtube_transcript_api.formatters import TextFormatter
 
+from agent.utils.http_client import get_sync_http_session
+from agent.utils.cache import SqliteCache
+from agent.utils.resilience import (
+    FetchError, circuit_breaker, domain_of, fetch_retrying, parse_retry_after, to_fetch_error,
+)
+from agent.utils.html_extract import StreamingPageParser, sniff_charset, CHARSET_SNIFF_BYTES
+from agent.utils.politeness import host_scheduler
+from agent.utils.usage import record_fetch
+
 # Initialize UserAgent
 ua = UserAgent()
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-async def fetch_web_content_async(session, url: str):
+# Streaming download limits: bytes read per page (after decompression) and chunk size
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+FETCH_CHUNK_BYTES = 16 * 1024
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "15")) # Per attempt
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+# Returned by fetch_web_content_async when a conditional request gets a 304
+NOT_MODIFIED = object()
+
+# Transcript fetching: preferred caption languages, dedicated bounded pool, persistent store
+TRANSCRIPT_LANGUAGES = ('ko', 'en')
+TRANSCRIPT_WORKERS = int(os.getenv("TRANSCRIPT_WORKERS", "4"))
+TRANSCRIPT_MAX_CHARS = int(os.getenv("TRANSCRIPT_MAX_CHARS", "60000")) # ~1 hour of speech; map-reduce summarized
+TRANSCRIPT_NEGATIVE_TTL = float(os.getenv("TRANSCRIPT_NEGATIVE_TTL", str(24 * 60 * 60))) # Captions may be added later
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "20000"))
+
+transcript_cache = SqliteCache("transcripts", max_entries=TRANSCRIPT_CACHE_MAX_ENTRIES)
+_transcript_executor = ThreadPoolExecutor(max_workers=TRANSCRIPT_WORKERS, thread_name_prefix="transcript")
+_transcript_api = None # (sync session it was built on, client)
+_transcript_formatter = TextFormatter()
+
+async def read_page_streaming(response, content_type: str, max_bytes: int = FETCH_MAX_BYTES):
+    """
+    Stream the response body into the incremental page parser.
+    Stops at max_bytes or as soon as the parser has enough text, so memory per
+    fetch stays flat regardless of page size. The charset comes from the header,
+    a BOM or <meta charset> in the first bytes.
+    """
+    parser = StreamingPageParser()
+    decoder = None
+    head = b""
+    received = 0
+
+    async for chunk in response.content.iter_chunked(FETCH_CHUNK_BYTES):
+        received += len(chunk)
+        if decoder is None:
+            # Hold back the first bytes until there is enough to sniff the charset
+            head += chunk
+            if len(head) < CHARSET_SNIFF_BYTES and received < max_bytes:
+                continue
+            decoder = codecs.getincrementaldecoder(sniff_charset(content_type, head))(errors="replace")
+            chunk, head = head, b""
+        if parser.feed(decoder.decode(chunk)) or received >= max_bytes:
+            break
+
+    if decoder is None:
+        decoder = codecs.getincrementaldecoder(sniff_charset(content_type, head))(errors="replace")
+        parser.feed(decoder.decode(head))
+    parser.feed(decoder.decode(b"", final=True))
+    record_fetch(received)
+    return parser.close()
+
+async def _fetch_page_once(session, url: str, validators=None, timeout: float = FETCH_TIMEOUT):
+    """
+    Single fetch attempt. Returns the page record or NOT_MODIFIED; raises FetchError otherwise.
+    """
+    headers = {'User-Agent': ua.random}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        if response.status == 304 and validators:
+            return NOT_MODIFIED
+        if response.status != 200:
+            raise FetchError(f"http_{response.status}", status=response.status,
+                             retry_after=parse_retry_after(response.headers.get("Retry-After")))
+        
+        # Gate on content type before reading anything (PDFs, images, binaries...)
+        content_type = response.headers.get("Content-Type", "")
+        mime = content_type.split(";")[0].strip().lower()
+        if mime and mime not in HTML_CONTENT_TYPES:
+            raise FetchError(f"content_type {mime}")
+
+        page = await read_page_streaming(response, content_type)
+        if not page["text"]:
+            # Paywall / JS wall / consent page
+            raise FetchError("no_text")
+
+        return {
+            **page,
+            # Validators for conditional revalidation of cached copies
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", "")
+        }
+
+async def fetch_web_content_async(session, url: str, validators=None, deadline=None):
     """
     Fetch text content and metadata from a URL asynchronously.
+    validators: optional {"etag", "last_modified"} from a cached copy; sends a
+    conditional request and returns NOT_MODIFIED on 304.
+    deadline: optional epoch seconds bounding retries and per-attempt timeouts.
+    Retries only transient failures; domains that keep failing are skipped by the circuit breaker.
+    Every attempt waits for a slot on the per-host scheduler, which is shared across jobs.
     """
+    domain = domain_of(url)
+    if not circuit_breaker.allow(domain):
+        print(f"Skipping {url}: circuit open for {domain}")
+        return None
+
     try:
-        headers = {'User-Agent': ua.random}
-        async with session.get(url, headers=headers, timeout=15) as response:
-            if response.status != 200:
-                print(f"Error fetching {url}: Status Code {response.status}")
-                return None
-            
-            html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Extract text
-            tags = soup.find_all(['p', 'h1', 'h2', 'h3', 'li'])
-            text = ' '.join([t.get_text() for t in tags])
-            
-            # Extract Metadata
-            thumbnail = ""
-            description = ""
-            
-            og_image = soup.find("meta", property="og:image")
-            if og_image:
-                thumbnail = og_image.get("content", "")
-                
-            meta_desc = soup.find("meta", attrs={"name": "description"}) or soup.find("meta", property="og:description")
-            if meta_desc:
-                description = meta_desc.get("content", "")
-            
-            if not text:
-                return None
-                
-            # Extract Date
-            published_date = ""
-            date_metas = [
-                {"property": "article:published_time"},
-                {"name": "date"},
-                {"name": "pubdate"},
-                {"name": "original-publication-date"},
-                {"name": "publication_date"},
-                {"property": "og:published_time"}
-            ]
-            
-            for meta_attr in date_metas:
-                tag = soup.find("meta", attrs=meta_attr)
-                if tag and tag.get("content"):
-                    published_date = tag.get("content").split("T")[0] # Extract YYYY-MM-DD
-                    break
-
-            return {
-                "text": text[:10000], # Increased limit
-                "thumbnail": thumbnail,
-                "description": description,
-                "published_date": published_date
-            }
+        async for attempt in fetch_retrying(deadline):
+            with attempt:
+                await host_scheduler.acquire(url, deadline)
+                timeout = FETCH_TIMEOUT
+                if deadline is not None:
+                    timeout = min(timeout, deadline - time.time())
+                    if timeout <= 0:
+                        raise FetchError("deadline")
+                try:
+                    result = await _fetch_page_once(session, url, validators, timeout)
+                except FetchError as e:
+                    if e.status == 429:
+                        # Throttled: hold back every job's requests to this host, not just ours
+                        host_scheduler.pause(url, e.retry_after or 1 / host_scheduler.limits_for(domain)[0])
+                    raise
     except Exception as e:
-        print(f"Async fetch error {url}: {e}")
+        error = to_fetch_error(e)
+        print(f"Async fetch error {url}: {error.reason}")
+        if error.counts_against_domain:
+            circuit_breaker.record_failure(domain, error.reason)
         return None
 
+    circuit_breaker.record_success(domain)
+    return result
+
+def _get_transcript_api():
+    global _transcript_api
+    # Borrow the pooled requests session instead of a fresh connection per call;
+    # rebuilt once close_http_session has replaced the session
+    session = get_sync_http_session()
+    if _transcript_api is None or _transcript_api[0] is not session:
+        _transcript_api = (session, YouTubeTranscriptApi(http_client=session))
+    return _transcript_api[1]
+
+def _fetch_transcript(video_id: str, languages=TRANSCRIPT_LANGUAGES):
+    """
+    One list call + one fetch: preferred languages first, otherwise any available track.
+    Returns None when the video has no captions; raises on other errors.
+    """
+    transcript_list = _get_transcript_api().list(video_id)
+    try:
+        transcript = transcript_list.find_transcript(languages)
+    except NoTranscriptFound:
+        transcript = next(iter(transcript_list), None)
+        if transcript is None:
+            return None
+    return _transcript_formatter.format_transcript(transcript.fetch())[:TRANSCRIPT_MAX_CHARS]
+
 def fetch_youtube_transcript(video_id: str):
     """
-    Fetch transcript for a YouTube video. (Sync wrapper, usually fast enough)
+    Fetch transcript for a YouTube video. (Sync)
     """
     try:
-        api = YouTubeTranscriptApi()
-        try:
-             transcript = api.fetch(video_id, languages=['ko', 'en'])
-        except:
-             transcript = api.fetch(video_id)
-             
-        formatter = TextFormatter()
-        return formatter.format_transcript(transcript)[:10000]
+        return _fetch_transcript(video_id)
     except Exception as e:
         # print(f"Error fetching transcript for {video_id}: {e}")
         return None
+
+async def fetch_youtube_transcript_async(video_id: str, languages=TRANSCRIPT_LANGUAGES):
+    """
+    Fetch transcript for a YouTube video through the transcript cache.
+    Transcripts for a video never change, so hits are served forever; videos without
+    captions are negatively cached for a while. Misses run on a small dedicated pool
+    so they don't compete with other work for the default executor.
+    """
+    # The length cap is part of the key so raising it doesn't keep serving truncated transcripts
+    key = f"{video_id}:{','.join(languages)}:{TRANSCRIPT_MAX_CHARS}"
+    cached = transcript_cache.get(key)
+    if cached is not None:
+        return cached.get("text")
+
+    loop = asyncio.get_running_loop()
+    try:
+        text = await loop.run_in_executor(_transcript_executor, _fetch_transcript, video_id, list(languages))
+    except (TranscriptsDisabled, NoTranscriptFound, VideoUnavailable):
+        text = None
+    except Exception as e:
+        # Transient (network / rate limit): don't cache
+        print(f"Error fetching transcript for {video_id}: {e}")
+        return None
+
+    if text:
+        await transcript_cache.aset(key, {"text": text})
+    else:
+        await transcript_cache.aset(key, {"text": None}, ttl=TRANSCRIPT_NEGATIVE_TTL)
+    return text
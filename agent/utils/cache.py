@@ -0,0 +1,194 @@
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from agent.utils.usage import record_cache
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+CACHE_DIR = Path(os.getenv("CACHE_DIR", str(BASE_DIR / ".cache")))
+
+class SqliteCache:
+    """
+    Small persistent key/value cache on SQLite (WAL).
+    Values are stored as JSON. Entries carry an optional expiry (TTL) and an
+    access timestamp used to evict least-recently-used rows past max_entries.
+    Lookups are sub-millisecond local reads, so callers use it directly from the event loop;
+    writes can wait on the lock held by another process sharing the file (API replicas,
+    workers), so async code goes through aset / arefresh, which run them in a thread.
+    Hits don't write: access times (LRU order only) are coarse and flushed in batches, so
+    processes sharing the file don't serialize on the write lock for every read.
+    """
+    EVICT_EVERY = 50 # Check the size cap every N writes
+    TOUCH_RESOLUTION = 60.0 # Access times closer than this to the stored one aren't updated
+    TOUCH_BATCH = 64 # Flush pending access times after this many...
+    TOUCH_FLUSH_INTERVAL = 30.0 # ...or this many seconds, whichever comes first
+
+    def __init__(self, name: str, ttl: Optional[float] = None, max_entries: Optional[int] = None, path: Optional[Path] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = Path(path) if path else CACHE_DIR / f"{name}.sqlite3"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._counters = {"hits": 0, "misses": 0}
+        self._touched: Dict[str, float] = {} # key -> pending accessed_at
+        self._last_flush = time.time()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                expires_at REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at)")
+
+    def get_entry(self, key: str, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Return {"value", "stored_at", "fresh"} or None.
+        Expired entries are only returned with allow_stale=True (e.g. for revalidation).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at, expires_at, accessed_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._counters["misses"] += 1
+                record_cache(self.name, "misses")
+                return None
+            value, stored_at, expires_at, accessed_at = row
+            fresh = expires_at is None or expires_at > now
+            if not fresh and not allow_stale:
+                self._counters["misses"] += 1
+                record_cache(self.name, "misses")
+                return None
+            if now - accessed_at >= self.TOUCH_RESOLUTION:
+                self._touched[key] = now
+                if len(self._touched) >= self.TOUCH_BATCH or now - self._last_flush >= self.TOUCH_FLUSH_INTERVAL:
+                    self._flush_touches()
+            if fresh:
+                self._counters["hits"] += 1
+                record_cache(self.name, "hits")
+        return {"value": json.loads(value), "stored_at": stored_at, "fresh": fresh}
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry["value"] if entry else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Store a value. ttl overrides the cache default (e.g. shorter TTLs for negative entries).
+        """
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl else None
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at, accessed_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, now, now, expires_at)
+            )
+            self._touched.pop(key, None)
+            self._writes += 1
+            if self._touched and now - self._last_flush >= self.TOUCH_FLUSH_INTERVAL:
+                self._flush_touches() # Already writing: piggyback the pending access times
+            if self.max_entries and self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    def refresh(self, key: str, ttl: Optional[float] = None):
+        """
+        Mark an existing entry fresh again (e.g. after a 304 Not Modified).
+        """
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET stored_at = ?, accessed_at = ?, expires_at = ? WHERE key = ?",
+                (now, now, expires_at, key)
+            )
+
+    async def arefresh(self, key: str, ttl: Optional[float] = None):
+        await asyncio.to_thread(self.refresh, key, ttl)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _flush_touches(self):
+        """
+        Write pending access times in one transaction (caller holds the lock).
+        """
+        if self._touched:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE entries SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()]
+            )
+            self._conn.execute("COMMIT")
+            self._touched.clear()
+        self._last_flush = time.time()
+
+    def _evict(self):
+        self._flush_touches() # LRU order needs the latest access times
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def count(self, name: str, n: int = 1):
+        """
+        Bump a named counter (for cache-specific events such as revalidations).
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+        record_cache(self.name, name, n)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self._conn.close()
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one in-flight coroutine.
+    Later callers await the first caller's result; a cancelled waiter doesn't cancel the shared call.
+    """
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
@@ -0,0 +1,69 @@
+import re
+from collections import Counter
+from typing import List, Tuple
+
+from agent.utils.ranker import tokenize
+
+# Sentence ends (Latin / CJK punctuation) and transcript line breaks
+SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?。！？])\s+|\n+")
+
+# Chunks scoring below this fraction of the best chunk are not worth an LLM call
+MIN_RELATIVE_SCORE = 0.2
+
+def split_chunks(text: str, size: int) -> List[str]:
+    """
+    Split text into chunks of at most ~size characters on sentence / line boundaries.
+    Sentences longer than size are hard-split.
+    """
+    chunks, current, length = [], [], 0
+    for sentence in SENTENCE_BREAK_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > size:
+            if current:
+                chunks.append(" ".join(current))
+                current, length = [], 0
+            chunks.append(sentence[:size])
+            sentence = sentence[size:]
+        if current and length + len(sentence) + 1 > size:
+            chunks.append(" ".join(current))
+            current, length = [], 0
+        current.append(sentence)
+        length += len(sentence) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def select_chunks(chunks: List[str], query: str, max_chunks: int) -> List[Tuple[int, str]]:
+    """
+    Extractive pre-compression: pick the chunks worth summarizing.
+    Each chunk is scored by query-term coverage plus centrality (how much of the document's
+    recurring vocabulary it carries); the opening chunk is always kept. Returns up to
+    max_chunks (index, chunk) pairs in document order.
+    """
+    chunk_tokens = [Counter(tokenize(chunk)) for chunk in chunks]
+    doc_tf = Counter()
+    for tokens in chunk_tokens:
+        doc_tf.update(tokens.keys()) # Number of chunks each term appears in
+    query_terms = set(tokenize(query))
+
+    scores = []
+    for tokens in chunk_tokens:
+        terms = set(tokens)
+        coverage = len(terms & query_terms) / len(query_terms) if query_terms else 0.0
+        # Terms recurring across chunks carry the topic; one-off terms are mostly noise/boilerplate
+        centrality = sum(doc_tf[t] - 1 for t in terms) / (len(terms) or 1)
+        scores.append((coverage, centrality))
+
+    max_centrality = max((c for _, c in scores), default=0) or 1
+    combined = [2 * coverage + centrality / max_centrality for coverage, centrality in scores]
+    best = max(combined, default=0)
+
+    picked = {0}
+    for i in sorted(range(len(chunks)), key=lambda i: combined[i], reverse=True):
+        if len(picked) >= max_chunks:
+            break
+        if combined[i] >= best * MIN_RELATIVE_SCORE:
+            picked.add(i)
+    return [(i, chunks[i]) for i in sorted(picked)]
@@ -0,0 +1,63 @@
+import os
+import time
+import asyncio
+from typing import Any, List, Optional
+
+# Share of the time left that search and rerank may use; extraction and summarization get the rest
+DEADLINE_SEARCH_SHARE = float(os.getenv("DEADLINE_SEARCH_SHARE", "0.3"))
+# Time kept back at the end of a job so that summarization can run on what was extracted
+# (at most half of what is left when extraction starts)
+DEADLINE_SUMMARY_RESERVE = float(os.getenv("DEADLINE_SUMMARY_RESERVE", "15"))
+# Time kept back for assembling the report from the summaries that finished
+DEADLINE_REPORT_RESERVE = float(os.getenv("DEADLINE_REPORT_RESERVE", "1"))
+# A job still running this long past its deadline is cancelled outright
+DEADLINE_GRACE = float(os.getenv("DEADLINE_GRACE", "10"))
+
+def time_left(deadline: Optional[float], reserve: float = 0.0) -> Optional[float]:
+    """
+    Seconds until deadline minus reserve (never negative), or None without a deadline.
+    """
+    if deadline is None:
+        return None
+    return max(0.0, deadline - reserve - time.time())
+
+def search_deadline(deadline: Optional[float]) -> Optional[float]:
+    """
+    When search and rerank have to stop so extraction and summarization keep most of the job's time.
+    """
+    if deadline is None:
+        return None
+    return time.time() + max(0.0, deadline - time.time()) * DEADLINE_SEARCH_SHARE
+
+def extraction_deadline(deadline: Optional[float]) -> Optional[float]:
+    """
+    When extraction has to stop so the rest of the job still fits before deadline.
+    """
+    if deadline is None:
+        return None
+    remaining = deadline - time.time()
+    return deadline - min(DEADLINE_SUMMARY_RESERVE, max(0.0, remaining) / 2)
+
+def hard_timeout(deadline: Optional[float]) -> Optional[float]:
+    """
+    Timeout (seconds) for a whole job run: the deadline plus DEADLINE_GRACE.
+    """
+    if deadline is None:
+        return None
+    return max(0.0, deadline + DEADLINE_GRACE - time.time())
+
+async def gather_until(tasks: List[asyncio.Task], timeout: Optional[float]) -> List[Any]:
+    """
+    Like asyncio.gather, but tasks still running after timeout seconds are cancelled
+    and yield None. Every task is cancelled if the caller is.
+    """
+    if not tasks:
+        return []
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+    finally:
+        for task in tasks:
+            task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    return [task.result() if task in done else None for task in tasks]
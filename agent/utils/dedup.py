@@ -0,0 +1,78 @@
+import os
+import heapq
+import string
+from typing import Any, Dict, List, Optional
+
+# Estimated Jaccard similarity (word 3-gram shingles) above which two documents are the same story
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.7"))
+SKETCH_SIZE = 64 # Bottom-k MinHash sketch size
+MIN_SHINGLES = 8 # Shorter texts are never treated as duplicates
+SAMPLE_CHARS = 5000 # Leading text fingerprinted (syndicated copies share their body, not just the tail)
+
+PUNCTUATION = str.maketrans(string.punctuation, " " * len(string.punctuation))
+
+def minhash_sketch(text: str, k: int = SKETCH_SIZE) -> Optional[List[int]]:
+    """
+    Bottom-k MinHash sketch: the k smallest hashes of the text's word 3-gram shingles.
+    One builtin hash per shingle and no per-item Python loop: a few hundred µs per page.
+    The builtin hash is salted per process; sketches are only compared within one.
+    """
+    words = text[:SAMPLE_CHARS].lower().translate(PUNCTUATION).split()
+    hashes = set(map(hash, zip(words, words[1:], words[2:])))
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    return sorted(hashes)[:k]
+
+def sketch_similarity(a: List[int], b: List[int], k: int = SKETCH_SIZE) -> float:
+    """
+    Estimated Jaccard similarity of the two shingle sets.
+    """
+    union = heapq.nsmallest(k, set(a) | set(b))
+    both = set(a) & set(b)
+    return sum(1 for h in union if h in both) / len(union)
+
+class Deduper:
+    """
+    Collapses near-duplicate extracted contents (syndicated articles, mirrored posts).
+    The best-ranked copy survives; the others' URLs are recorded on it as "alternate_urls".
+    """
+    def __init__(self, threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self._entries = [] # [sketch, rank, record]
+        self._ranks = {} # id(record) -> rank of the source it now represents
+        self.collapsed = 0
+
+    def add(self, rank: int, record: Dict[str, Any]) -> bool:
+        """
+        Register an extracted record. Returns False if it duplicates one already kept
+        (in which case it has been folded into that record).
+        """
+        sketch = minhash_sketch(record.get("content", ""))
+        if sketch is not None:
+            for entry in self._entries:
+                if sketch_similarity(sketch, entry[0]) >= self.threshold:
+                    self._merge(entry, rank, record)
+                    return False
+            self._entries.append([sketch, rank, record])
+        self._ranks[id(record)] = rank
+        return True
+
+    def _merge(self, entry, rank: int, record: Dict[str, Any]):
+        kept = entry[2]
+        alternates = kept.get("alternate_urls", [])
+        self.collapsed += 1
+        if rank < entry[1]:
+            # The better-ranked source arrived later: the kept record takes over its identity
+            print(f"--- Dedup: {record.get('url')} (rank {rank+1}) replaces duplicate {kept.get('url')} ---")
+            alternates = alternates + [kept.get("url")]
+            kept.clear()
+            kept.update(record)
+            entry[1] = rank
+            self._ranks[id(kept)] = rank
+        else:
+            print(f"--- Dedup: {record.get('url')} (rank {rank+1}) duplicates {kept.get('url')} ---")
+            alternates = alternates + [record.get("url")]
+        kept["alternate_urls"] = alternates
+
+    def rank_of(self, record: Dict[str, Any], default: int = 0) -> int:
+        return self._ranks.get(id(record), default)
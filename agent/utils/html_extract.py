@@ -0,0 +1,240 @@
+import os
+import re
+import codecs
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError: # Fall back to the stdlib tokenizer
+    etree = None
+
+# Long pages are map-reduce summarized: past SUMMARY_DIRECT_CHARS a page costs up to
+# SUMMARY_MAX_CHUNKS + 1 LLM calls (7 by default) instead of one
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "40000"))
+# "html.parser" (stdlib, block-for-block parity with the old BeautifulSoup code) or "lxml"
+# (C parser, opt-in: its tag-soup recovery differs, and it hasn't been checked against real saved pages)
+HTML_PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND", "html.parser")
+FEED_CHUNK_CHARS = 64 * 1024
+
+# Tags whose text makes up the page body (same set the BeautifulSoup version used)
+TEXT_TAGS = {"p", "h1", "h2", "h3", "li"}
+
+# Bytes inspected for a BOM / <meta charset> when the header doesn't declare one
+CHARSET_SNIFF_BYTES = 4096
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_\-:.]+)""", re.IGNORECASE)
+_BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+# Elements that never get an end tag
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+
+# Published-date meta tags in priority order
+DATE_METAS = [
+    ("property", "article:published_time"),
+    ("name", "date"),
+    ("name", "pubdate"),
+    ("name", "original-publication-date"),
+    ("name", "publication_date"),
+    ("property", "og:published_time"),
+]
+
+class _TextBlock:
+    __slots__ = ("tag", "parts", "closed")
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.parts = []
+        self.closed = False
+
+class PageExtractor:
+    """
+    Single-pass, streaming page extractor (parser target).
+    Collects text blocks and the OG/description/date meta in one traversal and
+    reports done once the text budget is final, so the caller can stop feeding.
+    Text of nested blocks is repeated the way find_all(...).get_text() did.
+    """
+    def __init__(self, max_chars: int = EXTRACT_MAX_CHARS):
+        self.max_chars = max_chars
+        self.done = False
+        self._blocks = []
+        self._stack = [] # Open elements: (tag, text block or None)
+        self._open = [] # Open text blocks (subset of the stack)
+        self._final_idx = 0 # Blocks before this index can no longer change
+        self._final_len = 0
+        self._meta = {}
+        self._result = None
+
+    # Parser target interface (lxml calls these directly)
+    def start(self, tag, attrib):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if tag == "meta":
+            self._meta_tag(attrib)
+        if tag in VOID_TAGS:
+            return
+        block = None
+        if tag in TEXT_TAGS:
+            block = _TextBlock(tag)
+            self._blocks.append(block)
+            self._open.append(block)
+        self._stack.append((tag, block))
+
+    def end(self, tag):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        # Pop back to the innermost matching element, closing anything opened inside it
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                popped = self._stack[i:]
+                del self._stack[i:]
+                if any(block for _, block in popped):
+                    for _, block in popped:
+                        if block:
+                            block.closed = True
+                    self._open = [block for _, block in self._stack if block]
+                    self._advance()
+                return
+
+    def data(self, data):
+        for block in self._open:
+            block.parts.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        if self._result is not None:
+            return self._result
+        for block in self._open:
+            block.closed = True
+        self._stack = []
+        self._open = []
+        text = " ".join("".join(block.parts) for block in self._blocks)
+        self._result = {
+            "text": text[:self.max_chars],
+            "thumbnail": self._meta.get("og:image", ""),
+            "description": self._meta["description"] if "description" in self._meta else self._meta.get("og:description", ""),
+            "published_date": self._published_date()
+        }
+        return self._result
+
+    def _advance(self):
+        blocks = self._blocks
+        while self._final_idx < len(blocks) and blocks[self._final_idx].closed:
+            self._final_len += sum(len(p) for p in blocks[self._final_idx].parts) + 1
+            self._final_idx += 1
+        if self._final_len >= self.max_chars:
+            self.done = True
+
+    def _meta_tag(self, attrib):
+        prop = attrib.get("property")
+        name = attrib.get("name")
+        content = attrib.get("content") or ""
+        # First matching tag wins, like soup.find()
+        if prop == "og:image":
+            self._meta.setdefault("og:image", content)
+        if prop == "og:description":
+            self._meta.setdefault("og:description", content)
+        if name == "description":
+            self._meta.setdefault("description", content)
+        for attr, value in DATE_METAS:
+            if attrib.get(attr) == value:
+                self._meta.setdefault(f"date:{attr}={value}", content)
+
+    def _published_date(self):
+        for attr, value in DATE_METAS:
+            content = self._meta.get(f"date:{attr}={value}")
+            if content:
+                return content.split("T")[0] # Extract YYYY-MM-DD
+        return ""
+
+class _StdlibFeeder(HTMLParser):
+    """
+    Adapts html.parser callbacks to the PageExtractor target interface.
+    """
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, {k: v for k, v in attrs if v is not None})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+class StreamingPageParser:
+    """
+    Incremental HTML -> page record. feed() text as it arrives (returns True once
+    enough text has been collected), then close().
+    Uses html.parser unless the lxml backend is selected (and installed).
+    """
+    def __init__(self, max_chars: int = EXTRACT_MAX_CHARS, backend: str = None):
+        self.target = PageExtractor(max_chars)
+        backend = backend or HTML_PARSER_BACKEND
+        if backend == "lxml" and etree is not None:
+            self._parser = etree.HTMLParser(target=self.target, recover=True)
+        else:
+            self._parser = _StdlibFeeder(self.target)
+
+    @property
+    def done(self):
+        return self.target.done
+
+    def feed(self, text: str) -> bool:
+        if not self.target.done and text:
+            self._parser.feed(text)
+        return self.target.done
+
+    def close(self):
+        try:
+            self._parser.close()
+        except Exception:
+            # lxml raises on empty/garbage documents; whatever was collected still counts
+            pass
+        return self.target.close()
+
+def _valid_codec(name):
+    try:
+        return codecs.lookup(name.strip().strip('"\'')).name
+    except (LookupError, AttributeError):
+        return None
+
+def sniff_charset(content_type: str, head: bytes) -> str:
+    """
+    Pick the document encoding: Content-Type charset, then BOM, then <meta charset>
+    in the first bytes, defaulting to utf-8.
+    """
+    for param in (content_type or "").split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            codec = _valid_codec(value)
+            if codec:
+                return codec
+    for bom, codec in _BOMS:
+        if head.startswith(bom):
+            return codec
+    match = _META_CHARSET_RE.search(head[:CHARSET_SNIFF_BYTES])
+    if match:
+        codec = _valid_codec(match.group(1).decode("ascii", "ignore"))
+        if codec:
+            return codec
+    return "utf-8"
+
+def extract_page(html: str, max_chars: int = EXTRACT_MAX_CHARS, backend: str = None):
+    """
+    Extract {"text", "thumbnail", "description", "published_date"} from an HTML string,
+    stopping as soon as the text budget is reached.
+    """
+    parser = StreamingPageParser(max_chars, backend)
+    for i in range(0, len(html), FEED_CHUNK_CHARS):
+        if parser.feed(html[i:i + FEED_CHUNK_CHARS]):
+            break
+    return parser.close()
@@ -0,0 +1,99 @@
+import os
+import asyncio
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pool tuning (process-wide, shared by every research job)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "8"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+
+DEFAULT_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+_session = None
+_session_loop = None
+_sync_session = None
+
+def _build_session():
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_MAX_CONNECTIONS,
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        use_dns_cache=True,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers=DEFAULT_HEADERS,
+        auto_decompress=True,
+    )
+
+def _discard_session(session, loop):
+    """
+    Close a session left over from another event loop. It can only be closed on its own
+    loop: scheduled there if that loop is still running, otherwise dropped with a warning.
+    """
+    if session is None or session.closed:
+        return
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+        return
+    print("--- HTTP client: Event loop of the previous session has stopped; its pooled connections are abandoned ---")
+    session.detach() # Already reported; skip aiohttp's "Unclosed client session" warning
+
+async def init_http_session():
+    """
+    Create the shared aiohttp session. Call once from the app lifespan / CLI entry point.
+    """
+    global _session, _session_loop
+    if _session is None or _session.closed:
+        _session = _build_session()
+        _session_loop = asyncio.get_running_loop()
+    return _session
+
+def get_http_session():
+    """
+    Borrow the shared aiohttp session.
+    Falls back to creating it lazily if no lifespan hook initialized it.
+    The session is bound to the running event loop.
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _discard_session(_session, _session_loop)
+        _session = _build_session()
+        _session_loop = loop
+    return _session
+
+def get_sync_http_session():
+    """
+    Shared pooled requests.Session for sync clients (e.g. youtube-transcript-api).
+    Clients built on it must check it is still the current one: close_http_session
+    replaces it.
+    """
+    global _sync_session
+    if _sync_session is None:
+        _sync_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_LIMIT_PER_HOST, pool_maxsize=HTTP_LIMIT_PER_HOST)
+        _sync_session.mount("https://", adapter)
+        _sync_session.mount("http://", adapter)
+        _sync_session.headers.update({"Accept-Encoding": DEFAULT_HEADERS["Accept-Encoding"]})
+    return _sync_session
+
+async def close_http_session():
+    """
+    Close the shared sessions and release pooled connections.
+    """
+    global _session, _session_loop, _sync_session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+    if _sync_session is not None:
+        _sync_session.close()
+        _sync_session = None
@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
@@ -9,7 +10,12 @@ def create_graph_inputs(
     end_date: Optional[str] = None,
     start_time: Optional[str] = None,
     end_time: Optional[str] = None,
-    count: int = 5
+    count: int = 5,
+    concurrency: int = 5,
+    pipeline: bool = False,
+    timeout: Optional[float] = None,
+    priority: int = 0,
+    batch_summaries: bool = True
 ) -> Dict[str, Any]:
     """
     Constructs the input dictionary for the LangGraph agent.
@@ -23,6 +29,11 @@ def create_graph_inputs(
         start_time: Start time (HH:MM:SS)
         end_time: End time (HH:MM:SS)
         count: Target number of summaries
+        concurrency: Max concurrent content fetches for this job
+        pipeline: Summarize each item as soon as it is extracted
+        timeout: Seconds the job may run; becomes an absolute deadline
+        priority: LLM dispatch priority (0 = interactive, 1 = batch/background)
+        batch_summaries: Summarize short items several to a request
         
     Returns:
         Dictionary compatible with AgentState
@@ -52,6 +63,12 @@ def create_graph_inputs(
             "endTime": end_time
         },
         "target_count": count,
+        "extract_concurrency": concurrency,
+        "pipeline": pipeline,
+        "timeout": timeout,
+        "deadline": time.time() + timeout if timeout else None,
+        "priority": priority,
+        "batch_summaries": batch_summaries,
         "depth": 0,
         "max_depth": 0 
     }
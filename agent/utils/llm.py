@@ -1,13 +1,73 @@
 import os
+import asyncio
+import threading
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 
-def get_llm():
+# Default chat model, overridable per task with LLM_MODEL_<TASK> (e.g. LLM_MODEL_SUMMARIZE=gpt-4o-mini)
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+# A plain float timeout keeps langchain-openai on its cached httpx pool, shared by every model
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_TASKS = ("rank", "summarize", "analyze")
+# Provider-native structured output: "function_calling" (gpt-3.5-turbo), "json_schema" (gpt-4o+) or "json_mode"
+LLM_STRUCTURED_METHOD = os.getenv("LLM_STRUCTURED_METHOD", "function_calling")
+
+_llm_registry = {}
+_llm_registry_lock = threading.Lock()
+
+def model_for(task: str = None) -> str:
+    if task:
+        return os.getenv(f"LLM_MODEL_{task.upper()}") or LLM_MODEL
+    return LLM_MODEL
+
+def get_llm(task: str = None, **params):
+    """
+    Shared chat model client for a task ("rank", "summarize", "analyze").
+    Instances are cached per (model, params) for the life of the process, so every
+    job reuses the same client and its keep-alive connections to the provider.
+    """
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         # Fallback or error - returning a dummy compatible object or raising error
         # For this prototype, if no key, we might just return None and handle it in agents
         print("Warning: OPENAI_API_KEY not found.")
         return None
-    
-    return ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+
+    model = model_for(task)
+    params = {"temperature": 0, **params}
+    key = (model, tuple(sorted(params.items())))
+    llm = _llm_registry.get(key)
+    if llm is None:
+        with _llm_registry_lock:
+            llm = _llm_registry.get(key)
+            if llm is None:
+                # Retries are owned by llm_dispatcher (shared rate-limit budget), not the client
+                llm = ChatOpenAI(model=model, timeout=LLM_TIMEOUT, max_retries=0, **params)
+                _llm_registry[key] = llm
+    return llm
+
+def structured_llm(llm, schema):
+    """
+    llm bound to a Pydantic output schema. Returns {"raw", "parsed", "parsing_error"}:
+    include_raw keeps a parse failure from raising, so it isn't mistaken for an API error.
+    """
+    return llm.with_structured_output(schema, method=LLM_STRUCTURED_METHOD, include_raw=True)
+
+async def warm_up_llms():
+    """
+    Build the clients for every task and open the provider connection pool
+    (a models.retrieve call, which costs no tokens). Call from the app lifespan.
+    """
+    llms = {}
+    for task in LLM_TASKS:
+        llm = get_llm(task)
+        if llm is None:
+            return
+        llms.setdefault(llm.model_name, llm)
+
+    for model, llm in llms.items():
+        try:
+            await asyncio.wait_for(llm.root_async_client.models.retrieve(model), timeout=10)
+            print(f"--- LLM client ready: {model} ---")
+        except Exception as e:
+            print(f"Warning: LLM warm-up failed for {model}: {e}")
@@ -0,0 +1,214 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+from typing import Optional
+
+import openai
+
+# Process-wide provider budget shared by every job (defaults sit under gpt-3.5-turbo tier-1 limits)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RPM = int(os.getenv("LLM_RPM", "3000"))
+LLM_TPM = int(os.getenv("LLM_TPM", "150000"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", "512")) # Reserved per call for the reply
+LLM_BACKOFF_BASE = 1.0 # seconds
+LLM_BACKOFF_MAX = 30.0
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0 # Stream-mode jobs (a client is watching)
+PRIORITY_BATCH = 1 # Async (polling) jobs
+
+# Failures worth another attempt; anything else propagates to the caller
+RETRYABLE_LLM_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+def estimate_text_tokens(text: str) -> int:
+    """
+    Rough token count: ~4 ASCII chars per token, ~1 token per non-ASCII char (Hangul etc.).
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+def estimate_tokens(messages) -> int:
+    total = 0
+    for message in messages:
+        text = message.content if isinstance(message.content, str) else str(message.content)
+        total += estimate_text_tokens(text) + 4
+    return total
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Retry-After from the provider response (retry-after-ms preferred), if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                pass
+    return None
+
+def _is_quota_error(error: Exception) -> bool:
+    # 429 for an exhausted billing quota will not clear by waiting
+    return getattr(error, "code", None) == "insufficient_quota"
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** (attempt - 1))))
+
+class LLMDispatcher:
+    """
+    Shared admission control for chat completions.
+    Calls wait in one priority queue and are admitted while there is a free concurrency
+    slot and room in the requests-per-minute / tokens-per-minute buckets (token cost is
+    estimated from the prompt and settled against reported usage afterwards).
+    A provider 429 pauses admission for everyone for Retry-After, since the limit is per organization.
+    """
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, rpm: int = LLM_RPM, tpm: int = LLM_TPM, max_attempts: int = LLM_MAX_ATTEMPTS):
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_attempts = max_attempts
+        self.rate_limited = 0
+        self._loop = None
+        self._seq = 0
+
+    def _bind(self):
+        # asyncio primitives belong to one event loop (the CLI runs a fresh loop per run)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._waiters = [] # heap of (priority, seq, cost, future)
+            self._active = 0
+            self._wake = asyncio.Event()
+            self._dispatcher = None
+            self._requests = float(self.rpm)
+            self._tokens = float(self.tpm)
+            self._updated = time.monotonic()
+            self._paused_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+        self._updated = now
+
+    def _kick(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        else:
+            self._wake.set()
+
+    def _admit(self) -> Optional[float]:
+        """
+        Admit queued calls in priority order; return seconds until the head could be admitted
+        (None = wait for a slot to be released).
+        """
+        while self._waiters:
+            _, _, cost, future = self._waiters[0]
+            if future.done(): # Caller gave up
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._active >= self.max_concurrency:
+                return None
+            self._refill()
+            cost = min(cost, self.tpm)
+            if self._requests < 1:
+                return (1 - self._requests) * 60 / self.rpm
+            if self._tokens < cost:
+                return (cost - self._tokens) * 60 / self.tpm
+            heapq.heappop(self._waiters)
+            self._requests -= 1
+            self._tokens -= cost
+            self._active += 1
+            future.set_result(None)
+        return None
+
+    async def _dispatch(self):
+        while self._waiters:
+            self._wake.clear()
+            delay = self._admit()
+            if not self._waiters:
+                break
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _acquire(self, cost: int, priority: int):
+        self._bind()
+        future = self._loop.create_future()
+        self._seq += 1
+        heapq.heappush(self._waiters, (priority, self._seq, cost, future))
+        self._kick()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we were cancelled: hand the slot back
+                self._release()
+            raise
+
+    def _release(self):
+        self._active -= 1
+        self._kick()
+
+    def _settle(self, cost: int, response):
+        # Refund (or charge) the difference between the estimate and the reported usage
+        if isinstance(response, dict): # with_structured_output(include_raw=True)
+            response = response.get("raw")
+        usage = getattr(response, "usage_metadata", None) or {}
+        actual = usage.get("total_tokens")
+        if actual:
+            self._tokens = min(self.tpm, self._tokens + cost - actual)
+
+    def pause(self, seconds: float):
+        self._bind()
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._kick()
+
+    def stats(self):
+        active = self._active if self._loop else 0
+        queued = len(self._waiters) if self._loop else 0
+        return {"active": active, "queued": queued, "rate_limited": self.rate_limited}
+
+    async def ainvoke(self, llm, messages, priority: int = PRIORITY_BATCH):
+        """
+        llm.ainvoke(messages) under the shared budget, retrying rate limits and transient errors.
+        """
+        cost = estimate_tokens(messages) + LLM_COMPLETION_TOKENS
+        for attempt in range(1, self.max_attempts + 1):
+            await self._acquire(cost, priority)
+            error = None
+            try:
+                response = await llm.ainvoke(messages)
+            except RETRYABLE_LLM_ERRORS as e:
+                error = e
+            finally:
+                self._release()
+
+            if error is None:
+                self._settle(cost, response)
+                return response
+            if attempt == self.max_attempts or _is_quota_error(error):
+                raise error
+
+            delay = retry_after_seconds(error)
+            if delay is None:
+                delay = _backoff(attempt)
+            if isinstance(error, openai.RateLimitError):
+                self.rate_limited += 1
+                print(f"--- LLM rate limited, pausing all calls for {delay:.1f}s ---")
+                self.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+
+# Process-wide dispatcher shared by every job
+llm_dispatcher = LLMDispatcher()
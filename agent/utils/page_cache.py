@@ -0,0 +1,66 @@
+import os
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from agent.utils.cache import SqliteCache
+from agent.utils.async_tools import fetch_web_content_async, NOT_MODIFIED
+
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", str(6 * 60 * 60))) # 6 hours
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "5000"))
+
+# Query parameters that never change page content
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "ref_src", "mc_cid", "mc_eid")
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical cache key for a URL: lowercase scheme/host, no default port,
+    no fragment, tracking params dropped and the remaining query sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parts.path or "/"
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not k.lower().startswith(TRACKING_PARAMS)]
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(query)), ""))
+
+page_cache = SqliteCache("pages", ttl=PAGE_CACHE_TTL, max_entries=PAGE_CACHE_MAX_ENTRIES)
+
+async def fetch_page_cached(session, url: str, deadline=None):
+    """
+    Cache-aware page fetch returning the extracted page record.
+    Fresh entries are served directly; stale entries are revalidated with
+    If-None-Match / If-Modified-Since so unchanged pages only cost a 304.
+    A stale record is served if the refetch fails.
+    """
+    key = normalize_url(url)
+    entry = page_cache.get_entry(key, allow_stale=True)
+    if entry and entry["fresh"]:
+        return entry["value"]
+
+    validators = None
+    if entry:
+        validators = {
+            "etag": entry["value"].get("etag"),
+            "last_modified": entry["value"].get("last_modified")
+        }
+
+    record = await fetch_web_content_async(session, url, validators=validators, deadline=deadline)
+
+    if record is NOT_MODIFIED:
+        await page_cache.arefresh(key)
+        page_cache.count("revalidated")
+        return entry["value"]
+
+    if entry:
+        # Stale entry that had to be refetched
+        page_cache.count("misses")
+
+    if record:
+        await page_cache.aset(key, record)
+        return record
+
+    if entry:
+        page_cache.count("stale_served")
+        return entry["value"]
+    return None
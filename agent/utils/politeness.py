@@ -0,0 +1,135 @@
+import os
+import time
+import math
+import heapq
+import asyncio
+from typing import Dict, Optional, Tuple
+
+from agent.utils.resilience import FetchError, domain_of
+
+# Default per-host budget: requests per second and burst size
+DOMAIN_RATE_DEFAULT = float(os.getenv("DOMAIN_RATE_DEFAULT", "2"))
+DOMAIN_BURST_DEFAULT = int(os.getenv("DOMAIN_BURST_DEFAULT", "4"))
+
+# Community hosts we hit most (see tavily_search tagging) are throttled harder
+DEFAULT_DOMAIN_RATES = {
+    "reddit.com": (0.5, 2),
+    "medium.com": (1.0, 2),
+    "velog.io": (1.0, 2),
+    "news.ycombinator.com": (1.0, 2),
+}
+
+def parse_domain_rates(spec: str) -> Dict[str, Tuple[float, int]]:
+    """
+    Parse DOMAIN_RATE_LIMITS, e.g. "reddit.com=0.5:2,medium.com=1" (rate[:burst]).
+    """
+    rates = {}
+    for entry in (spec or "").split(","):
+        domain, _, value = entry.strip().partition("=")
+        if not domain or not value:
+            continue
+        rate, _, burst = value.partition(":")
+        try:
+            rates[domain.lower()] = (float(rate), int(burst) if burst else max(1, math.ceil(float(rate))))
+        except ValueError:
+            print(f"Warning: invalid DOMAIN_RATE_LIMITS entry '{entry}'")
+    return rates
+
+class _HostBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "paused_until", "waiters", "dispatcher")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiters = [] # heap of (deadline, seq, future)
+        self.dispatcher = None
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+class HostScheduler:
+    """
+    Process-wide per-host token-bucket scheduler for page fetches.
+    Every job's requests to the same host share one bucket, so concurrent jobs can't
+    burst a domain into 429s. Waiters are served earliest-deadline-first (jobs without
+    a deadline go last, FIFO among equals).
+    """
+    def __init__(self, default_rate: float = DOMAIN_RATE_DEFAULT, default_burst: int = DOMAIN_BURST_DEFAULT, rates: Optional[Dict[str, Tuple[float, int]]] = None):
+        self.default = (default_rate, default_burst)
+        self.rates = dict(DEFAULT_DOMAIN_RATES)
+        self.rates.update(rates or {})
+        self._buckets: Dict[str, _HostBucket] = {}
+        self._seq = 0
+
+    def limits_for(self, domain: str) -> Tuple[float, int]:
+        # Match the domain or any parent domain (old.reddit.com -> reddit.com)
+        parts = domain.split(".")
+        for i in range(len(parts) - 1):
+            limits = self.rates.get(".".join(parts[i:]))
+            if limits:
+                return limits
+        return self.default
+
+    def _bucket(self, domain: str) -> _HostBucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            bucket = _HostBucket(*self.limits_for(domain))
+            self._buckets[domain] = bucket
+        return bucket
+
+    async def acquire(self, url: str, deadline: Optional[float] = None):
+        """
+        Wait for a request slot on url's host.
+        Raises FetchError("deadline") if the slot can't be had before the deadline.
+        """
+        bucket = self._bucket(domain_of(url))
+        bucket.refill()
+        if not bucket.waiters and bucket.tokens >= 1 and time.monotonic() >= bucket.paused_until:
+            bucket.tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(bucket.waiters, (deadline if deadline is not None else math.inf, self._seq, future))
+        if bucket.dispatcher is None or bucket.dispatcher.done():
+            bucket.dispatcher = asyncio.create_task(self._dispatch(bucket))
+
+        try:
+            if deadline is None:
+                await future
+            else:
+                await asyncio.wait_for(future, timeout=max(0.0, deadline - time.time()))
+        except asyncio.TimeoutError:
+            raise FetchError("deadline")
+
+    def pause(self, url: str, seconds: float):
+        """
+        Back off a host after it throttled us (429 / Retry-After).
+        """
+        bucket = self._bucket(domain_of(url))
+        bucket.tokens = 0.0
+        bucket.paused_until = max(bucket.paused_until, time.monotonic() + seconds)
+
+    async def _dispatch(self, bucket: _HostBucket):
+        while bucket.waiters:
+            now = time.monotonic()
+            if now < bucket.paused_until:
+                await asyncio.sleep(bucket.paused_until - now)
+                continue
+            bucket.refill()
+            if bucket.tokens < 1:
+                await asyncio.sleep((1 - bucket.tokens) / bucket.rate)
+                continue
+            _, _, future = heapq.heappop(bucket.waiters)
+            if future.done(): # Waiter gave up (cancelled / deadline)
+                continue
+            bucket.tokens -= 1
+            future.set_result(None)
+
+# Process-wide scheduler shared by every job
+host_scheduler = HostScheduler(rates=parse_domain_rates(os.getenv("DOMAIN_RATE_LIMITS", "")))
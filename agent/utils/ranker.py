@@ -1,95 +1,210 @@
-import json
-from typing import List, Dict, Any
-from agent.utils.llm import get_llm
+import os
+import re
+import math
+import asyncio
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
+from pydantic import BaseModel, Field
+from agent.utils.llm import get_llm, structured_llm
+from agent.utils.llm_scheduler import llm_dispatcher, PRIORITY_BATCH
+from agent.utils.deadline import time_left
 from langchain_core.messages import SystemMessage, HumanMessage
 
-def rank_results(query: str, results: List[Dict[str, Any]], top_k: int = 5) -> List[Dict[str, Any]]:
-    """
-    Rerank search results using LLM based on relevance to the query.
-    """
-    if not results:
-        return []
-    
-    llm = get_llm()
-    if not llm:
-        # Fallback: Just return the top_k results as is if no LLM
-        return results[:top_k]
-
-    # Prepare input for LLM
-    candidates_text = ""
-    for i, res in enumerate(results):
-        candidates_text += f"[{i}] Title: {res.get('title')}\n    Snippet: {res.get('description', '')[:200]}\n    Source: {res.get('source')}\n\n"
+# How many lexically pre-ranked candidates the LLM reranks; the rest keep their lexical order
+RANK_LLM_SHORTLIST = int(os.getenv("RANK_LLM_SHORTLIST", "12"))
+# Give up on the LLM and use the lexical ranking after this many seconds
+RANK_LLM_TIMEOUT = float(os.getenv("RANK_LLM_TIMEOUT", "20"))
+# With less time than this before the deadline the LLM isn't asked at all
+RANK_LLM_MIN_SECONDS = float(os.getenv("RANK_LLM_MIN_SECONDS", "2"))
+# A lexical ranking used because the LLM failed is cached this long (seconds, 0 = not at all), not the full search TTL
+RANK_FALLBACK_CACHE_TTL = float(os.getenv("RANK_FALLBACK_CACHE_TTL", "60"))
 
-        prompt = f"""
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+TITLE_WEIGHT = 2 # Title terms are counted this many times
 
-        You are a Search Relevance Ranker.
+# Diversity: score multiplier per already-picked result from the same domain / source type
+DOMAIN_REPEAT_PENALTY = 0.7
+SOURCE_REPEAT_PENALTY = 0.9
 
-        
+TOKEN_RE = re.compile(r"[a-z0-9]+|[가-힣]+")
 
-        Query: "{query}"
+class Ranking(BaseModel):
+    index: int = Field(description="The original index of the result [0, 1, ...]")
+    score: int = Field(description="Relevance score from 0 to 10. Give 0 if irrelevant or duplicate.")
+    reason: str = Field(description="Brief reason for the score")
 
-        
+class RankingOutput(BaseModel):
+    rankings: List[Ranking]
 
-        Task: 
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens; Hangul words also contribute character bigrams
+    so that particles/endings ("모델은", "모델의") still match the stem.
+    """
+    tokens = []
+    for word in TOKEN_RE.findall((text or "").lower()):
+        tokens.append(word)
+        if len(word) > 2 and "가" <= word[0] <= "힣":
+            tokens.extend(word[i:i+2] for i in range(len(word) - 1))
+    return tokens
+
+def snippet_of(res: Dict[str, Any]) -> str:
+    # YouTube results carry "description", Tavily results carry "content"
+    return res.get("description") or res.get("content") or ""
+
+def result_domain(res: Dict[str, Any]) -> str:
+    host = (urlsplit(res.get("url", "")).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+def bm25_scores(query: str, results: List[Dict[str, Any]]) -> List[float]:
+    """
+    BM25 of the query against title (weighted), snippet, source and domain of each result.
+    """
+    docs = []
+    for res in results:
+        text = " ".join([(res.get("title") or "") + " "] * TITLE_WEIGHT) + " ".join([snippet_of(res)[:500], res.get("source") or "", result_domain(res)])
+        docs.append(Counter(tokenize(text)))
+
+    query_terms = set(tokenize(query))
+    n = len(docs)
+    avg_len = (sum(sum(d.values()) for d in docs) / n) or 1
+    df = {t: sum(1 for d in docs if t in d) for t in query_terms}
+
+    scores = []
+    for d in docs:
+        length = sum(d.values())
+        score = 0.0
+        for t in query_terms:
+            tf = d.get(t, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+        scores.append(score)
+    return scores
+
+def prerank(query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Lexical ranking with a diversity penalty: results are picked greedily by BM25 score,
+    discounted for every result already picked from the same domain / source type.
+    Ties keep search order. Each result gets a "lexical_score".
+    """
+    scores = bm25_scores(query, results)
+    for res, score in zip(results, scores):
+        res["lexical_score"] = round(score, 3)
+
+    remaining = list(range(len(results)))
+    domain_counts, source_counts = Counter(), Counter()
+    ordered = []
+    while remaining:
+        def adjusted(i):
+            res = results[i]
+            return scores[i] * DOMAIN_REPEAT_PENALTY ** domain_counts[result_domain(res)] * SOURCE_REPEAT_PENALTY ** source_counts[res.get("source")]
+        best = max(remaining, key=lambda i: (adjusted(i), -i))
+        remaining.remove(best)
+        res = results[best]
+        domain_counts[result_domain(res)] += 1
+        source_counts[res.get("source")] += 1
+        ordered.append(res)
+    return ordered
+
+def lexical_ranking(ordered: List[Dict[str, Any]], top_k: int, max_score: int = 10) -> List[Dict[str, Any]]:
+    """
+    Fallback ranking: the pre-ranked order, with relevance_score scaled to 0-max_score.
+    """
+    top = max((res["lexical_score"] for res in ordered), default=0) or 1
+    for res in ordered[:top_k]:
+        res["relevance_score"] = round(max_score * res["lexical_score"] / top)
+        res["relevance_reason"] = "lexical match"
+    return ordered[:top_k]
 
-        1. Rank the following search results based on their relevance, information density, and credibility.
+async def rank_results(query: str, results: List[Dict[str, Any]], top_k: int = 5, priority: int = PRIORITY_BATCH, deadline: Optional[float] = None) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Rerank search results: a local BM25 + diversity pass orders every candidate, then the
+    LLM reranks only the shortlist. The lexical order is the fallback when the LLM is
+    unavailable, fails or is too slow (RANK_LLM_TIMEOUT, or the deadline if sooner).
+    Returns (results, fell_back); fell_back is True when the LLM was configured but its
+    ranking couldn't be used, i.e. the result is a degraded one.
+    """
+    if not results:
+        return [], False
 
-        2. DEDUPLICATE: If multiple results convey the exact same information (e.g. same press release on different sites), keep only the best source and discard the others (score 0).
+    ordered = prerank(query, results)
 
-        3. DIVERSITY: Prefer a diverse set of sources (e.g. mix of official docs, news, videos, community discussions).
+    llm = get_llm("rank")
+    if not llm:
+        return lexical_ranking(ordered, top_k), False
 
-        
+    timeout = RANK_LLM_TIMEOUT if deadline is None else min(RANK_LLM_TIMEOUT, time_left(deadline))
+    if timeout < RANK_LLM_MIN_SECONDS:
+        print(f"Ranking skipped ({timeout:.1f}s to the deadline), using lexical ranking")
+        return lexical_ranking(ordered, top_k), True
 
-        Return a JSON object with a key "rankings" containing a list of objects.
+    shortlist = ordered[:RANK_LLM_SHORTLIST]
+    rest = ordered[RANK_LLM_SHORTLIST:]
 
-        Each object must have:
+    # Prepare input for LLM
+    candidates_text = ""
+    for i, res in enumerate(shortlist):
+        candidates_text += f"[{i}] Title: {res.get('title')}\n    Snippet: {snippet_of(res)[:200]}\n    Source: {res.get('source')}\n\n"
 
-        - "index": (int) the original index of the result [0, 1, ...]
+    prompt = f"""
+        You are a Search Relevance Ranker.
 
-        - "score": (int) relevance score from 0 to 10. Give 0 if irrelevant or duplicate.
+        Query: "{query}"
 
-        - "reason": (string) brief reason for the score
+        Task:
+        1. Rank the following search results based on their relevance, information density, and credibility.
+        2. DEDUPLICATE: If multiple results convey the exact same information (e.g. same press release on different sites), keep only the best source and discard the others (score 0).
+        3. DIVERSITY: Prefer a diverse set of sources (e.g. mix of official docs, news, videos, community discussions).
 
-        
+        Score every result by its index [0, 1, ...].
 
         Results to Rank:
-
         {candidates_text}
-
         """
 
     try:
-        response = llm.invoke([
-            SystemMessage(content="You are a precise ranking algorithm. Output valid JSON only."), 
+        response = await asyncio.wait_for(llm_dispatcher.ainvoke(structured_llm(llm, RankingOutput), [
+            SystemMessage(content="You are a precise ranking algorithm."),
             HumanMessage(content=prompt)
-        ])
-        
-        content_str = response.content.strip()
-        if content_str.startswith("```json"):
-            content_str = content_str[7:-3].strip()
-        elif content_str.startswith("```"):
-            content_str = content_str[3:-3].strip()
-            
-        data = json.loads(content_str)
-        rankings = data.get("rankings", [])
-        
+        ], priority), timeout=timeout)
+
+        parsed = response["parsed"]
+        if parsed is None:
+            raise ValueError(response["parsing_error"])
+
         # Map scores back to results
         ranked_results = []
-        for r in rankings:
-            idx = r.get("index")
-            if idx is not None and 0 <= idx < len(results):
-                item = results[idx]
-                item["relevance_score"] = r.get("score", 0)
-                item["relevance_reason"] = r.get("reason", "")
+        seen = set()
+        for r in parsed.rankings:
+            if 0 <= r.index < len(shortlist) and r.index not in seen:
+                seen.add(r.index)
+                item = shortlist[r.index]
+                item["relevance_score"] = r.score
+                item["relevance_reason"] = r.reason
                 ranked_results.append(item)
-        
-        # Sort by score descending
+
+        # Sort by score descending (stable, so lexical order breaks ties)
         ranked_results.sort(key=lambda x: x.get("relevance_score", 0), reverse=True)
-        
+        # Results scored 0 (irrelevant or duplicate) go last, behind candidates nobody reviewed
+        rejected = [res for res in ranked_results if res["relevance_score"] <= 0]
+        ranked_results = [res for res in ranked_results if res["relevance_score"] > 0]
+
+        # Candidates the LLM skipped or never saw follow in lexical order, scored below the LLM's picks
+        unscored = [res for i, res in enumerate(shortlist) if i not in seen] + rest
+        floor = ranked_results[-1]["relevance_score"] if ranked_results else 10
+        ranked_results += lexical_ranking(unscored, len(unscored), max_score=floor) + rejected
+
         # Return top K
-        return ranked_results[:top_k]
+        return ranked_results[:top_k], False
 
+    except asyncio.TimeoutError:
+        print(f"Ranking timed out after {timeout:.1f}s, using lexical ranking")
+        return lexical_ranking(ordered, top_k), True
     except Exception as e:
-        print(f"Ranking error: {e}")
-        # Fallback to original order
-        return results[:top_k]
+        print(f"Ranking error: {e}, using lexical ranking")
+        return lexical_ranking(ordered, top_k), True
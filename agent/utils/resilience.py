@@ -0,0 +1,155 @@
+import os
+import time
+import random
+import asyncio
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt
+
+FETCH_MAX_ATTEMPTS = int(os.getenv("FETCH_MAX_ATTEMPTS", "3"))
+FETCH_BACKOFF_BASE = float(os.getenv("FETCH_BACKOFF_BASE", "0.5")) # seconds
+FETCH_BACKOFF_MAX = float(os.getenv("FETCH_BACKOFF_MAX", "8"))
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", str(10 * 60))) # seconds
+BREAKER_MAX_COOLDOWN = float(os.getenv("BREAKER_MAX_COOLDOWN", str(6 * 60 * 60)))
+BREAKER_PROBE_WINDOW = 60.0 # A half-open probe that never reports back frees the slot after this
+
+# Transient statuses worth another attempt
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+# Statuses that say "this domain won't serve us" (blocked / paywalled / throttled)
+BREAKER_STATUSES = {401, 402, 403, 429, 451}
+
+class FetchError(Exception):
+    """
+    A failed page fetch. reason is a short tag ("http_403", "timeout", "no_text", ...).
+    """
+    def __init__(self, reason: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES or self.reason == "timeout"
+
+    @property
+    def counts_against_domain(self) -> bool:
+        return self.status in BREAKER_STATUSES or self.reason in ("timeout", "no_text") or (self.status or 0) >= 500
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After in seconds (only the delta-seconds form is honored).
+    """
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, FetchError):
+        return exc.retryable
+    return isinstance(exc, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError))
+
+def to_fetch_error(exc: BaseException) -> FetchError:
+    if isinstance(exc, FetchError):
+        return exc
+    if isinstance(exc, asyncio.TimeoutError):
+        return FetchError("timeout")
+    return FetchError(type(exc).__name__)
+
+def domain_of(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+class _BackoffWait:
+    """
+    Full-jitter exponential backoff; honors Retry-After (up to the backoff cap) when the server sent one.
+    """
+    def __call__(self, retry_state) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        if isinstance(exc, FetchError) and exc.retry_after is not None:
+            return min(exc.retry_after, FETCH_BACKOFF_MAX)
+        cap = min(FETCH_BACKOFF_MAX, FETCH_BACKOFF_BASE * (2 ** (retry_state.attempt_number - 1)))
+        return random.uniform(0, cap)
+
+class _StopAtDeadline:
+    """
+    Stop retrying when the next sleep would run past the job deadline.
+    """
+    def __init__(self, deadline: Optional[float]):
+        self.deadline = deadline
+
+    def __call__(self, retry_state) -> bool:
+        if self.deadline is None:
+            return False
+        return time.time() + (retry_state.upcoming_sleep or 0) >= self.deadline
+
+def fetch_retrying(deadline: Optional[float] = None) -> AsyncRetrying:
+    """
+    Retry policy for page fetches: retryable statuses/errors only, jittered
+    exponential backoff, bounded by attempt count and the job deadline.
+    """
+    return AsyncRetrying(
+        retry=retry_if_exception(is_retryable),
+        wait=_BackoffWait(),
+        stop=stop_after_attempt(FETCH_MAX_ATTEMPTS) | _StopAtDeadline(deadline),
+        reraise=True,
+    )
+
+class CircuitBreaker:
+    """
+    Per-domain circuit breaker.
+    After BREAKER_FAILURE_THRESHOLD consecutive domain-level failures (403s, paywalls,
+    timeouts, ...) the domain is skipped for a cooldown. Once the cooldown ends, one probe
+    request is let through: success closes the circuit, failure re-opens it with a doubled cooldown.
+    """
+    def __init__(self, threshold: int = BREAKER_FAILURE_THRESHOLD, cooldown: float = BREAKER_COOLDOWN, max_cooldown: float = BREAKER_MAX_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._domains: Dict[str, Dict] = {}
+
+    def _state(self, domain: str) -> Dict:
+        return self._domains.setdefault(domain, {"failures": 0, "open_until": 0.0, "trips": 0, "last_reason": "", "probing": False})
+
+    def allow(self, domain: str) -> bool:
+        state = self._domains.get(domain)
+        if not state or state["failures"] < self.threshold:
+            return True
+        now = time.time()
+        if now < state["open_until"]:
+            return False
+        # Half-open: let a single probe through, hold the rest back until it reports
+        state["open_until"] = now + BREAKER_PROBE_WINDOW
+        state["probing"] = True
+        return True
+
+    def record_success(self, domain: str):
+        state = self._domains.get(domain)
+        if state:
+            state.update(failures=0, open_until=0.0, trips=0, probing=False)
+
+    def record_failure(self, domain: str, reason: str):
+        state = self._state(domain)
+        was_open = state["failures"] >= self.threshold
+        state["failures"] += 1
+        state["last_reason"] = reason
+        # Only a closed -> open or half-open -> open transition (re)trips the breaker; failures of
+        # requests that were already in flight when it opened don't extend the cooldown again
+        if state["failures"] >= self.threshold and (not was_open or state["probing"]):
+            state["probing"] = False
+            cooldown = min(self.max_cooldown, self.cooldown * (2 ** state["trips"]))
+            state["open_until"] = time.time() + cooldown
+            state["trips"] += 1
+            print(f"--- Circuit open for {domain} ({reason}), skipping for {int(cooldown)}s ---")
+
+    def open_domains(self) -> Dict[str, str]:
+        now = time.time()
+        return {d: s["last_reason"] for d, s in self._domains.items() if s["failures"] >= self.threshold and s["open_until"] > now}
+
+# Process-wide breaker shared by every job
+circuit_breaker = CircuitBreaker()
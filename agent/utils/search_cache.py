@@ -0,0 +1,66 @@
+import os
+import re
+import copy
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agent.utils.cache import SqliteCache, SingleFlight
+
+# How long a search result set is considered fresh (also the date_range bucket width)
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(10 * 60))) # 10 minutes
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+
+search_cache = SqliteCache("search", ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES)
+_search_flight = SingleFlight()
+
+def normalize_query(query: str) -> str:
+    query = unicodedata.normalize("NFKC", query or "")
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+def date_range_bucket(date_range: Optional[Dict[str, str]]) -> str:
+    """
+    Collapse a date range into a cache bucket.
+    The default range ends "now", so the end time is floored to the freshness window;
+    requests made within the same window share a bucket.
+    """
+    if not date_range:
+        return "any"
+    window = max(1, int(SEARCH_CACHE_TTL // 60)) # minutes
+    end_time = date_range.get("endTime", "23:59:59")
+    try:
+        hh, mm = (int(x) for x in end_time.split(":")[:2])
+        minutes = (hh * 60 + mm) // window * window
+        end_time = f"{minutes // 60:02d}:{minutes % 60:02d}"
+    except ValueError:
+        pass
+    return f"{date_range.get('startDate', '')}T{date_range.get('startTime', '')}~{date_range.get('endDate', '')}T{end_time}"
+
+def search_cache_key(query: str, date_range: Optional[Dict[str, str]], source: str) -> str:
+    return f"{source}|{date_range_bucket(date_range)}|{normalize_query(query)}"
+
+async def cached_search(query: str, date_range: Optional[Dict[str, str]], source: str,
+                        fetch: Callable[[], Awaitable[List[Dict[str, Any]]]],
+                        ttl_of: Optional[Callable[[List[Dict[str, Any]]], Optional[float]]] = None) -> List[Dict[str, Any]]:
+    """
+    Serve results for (query, date_range bucket, source) from the cache.
+    Concurrent misses for the same key are coalesced into a single fetch.
+    Empty result sets are not cached (usually an upstream failure); ttl_of(results) can
+    give a fetched set a shorter TTL than SEARCH_CACHE_TTL (None keeps the default, 0 skips caching).
+    """
+    key = search_cache_key(query, date_range, source)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    async def fetch_and_store():
+        results = await fetch()
+        ttl = ttl_of(results) if ttl_of and results else None
+        if results and ttl != 0:
+            await search_cache.aset(key, results, ttl=ttl)
+        return results
+
+    if _search_flight.in_flight(key):
+        search_cache.count("coalesced")
+    results = await _search_flight.do(key, fetch_and_store)
+    # Coalesced callers get their own copy (downstream nodes annotate result dicts)
+    return copy.deepcopy(results)
@@ -0,0 +1,123 @@
+import os
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+from tavily import AsyncTavilyClient
+from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+
+from agent.utils.tools import (
+    tavily_search_params, parse_tavily_response, tavily_mock_results,
+    youtube_search_params, parse_youtube_response, youtube_mock_results,
+)
+from agent.utils.search_cache import cached_search
+from agent.utils.deadline import time_left
+
+class SearchSource:
+    """
+    Common async interface for a search backend.
+    Subclasses implement search(); run() applies the per-source timeout (cut short by
+    the job's search deadline, if any) and turns failures into an empty result list so one source can't hold up the rest.
+    Clients are built once per process and reused across jobs.
+    """
+    name = "base"
+
+    def __init__(self, max_results: int, timeout: float):
+        self.max_results = max_results
+        self.timeout = timeout
+
+    async def search(self, query: str, max_results: int, date_range: Optional[Dict[str, str]]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def run(self, query: str, date_range: Optional[Dict[str, str]] = None, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        timeout = self.timeout if deadline is None else min(self.timeout, time_left(deadline))
+        try:
+            return await asyncio.wait_for(self.search(query, self.max_results, date_range), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Search source '{self.name}' timed out after {timeout:.1f}s")
+            return []
+        except Exception as e:
+            print(f"Search source '{self.name}' error: {e}")
+            return []
+
+class TavilySource(SearchSource):
+    """
+    Broad web/community search via the async Tavily client.
+    """
+    name = "tavily"
+
+    def __init__(self, max_results: int = 20, timeout: float = 20):
+        super().__init__(max_results, timeout)
+        self._client = None
+
+    def _get_client(self, api_key: str):
+        if self._client is None:
+            self._client = AsyncTavilyClient(api_key=api_key)
+        return self._client
+
+    async def search(self, query, max_results, date_range):
+        api_key = os.getenv("TAVILY_API_KEY")
+        if not api_key:
+            print("Warning: TAVILY_API_KEY not found. Returning mock data.")
+            return tavily_mock_results()
+
+        client = self._get_client(api_key)
+        response = await client.search(**tavily_search_params(query, max_results, date_range))
+        return parse_tavily_response(response)
+
+class YouTubeSource(SearchSource):
+    """
+    YouTube Data API search.
+    The discovery document is parsed once; each request executes on its own
+    httplib2 transport because the shared one is not thread-safe.
+    googleapiclient has no async transport, so execution is offloaded to a thread.
+    """
+    name = "youtube"
+
+    def __init__(self, max_results: int = 10, timeout: float = 10):
+        super().__init__(max_results, timeout)
+        self._service = None
+        self._lock = threading.Lock()
+
+    def _get_service(self, api_key: str):
+        with self._lock:
+            if self._service is None:
+                self._service = build('youtube', 'v3', developerKey=api_key, cache_discovery=False)
+            return self._service
+
+    def _search_sync(self, api_key, query, max_results, date_range):
+        request = self._get_service(api_key).search().list(**youtube_search_params(query, max_results, date_range))
+        return parse_youtube_response(request.execute(http=build_http()))
+
+    async def search(self, query, max_results, date_range):
+        api_key = os.getenv("YOUTUBE_API_KEY")
+        if not api_key:
+            print("Warning: YOUTUBE_API_KEY not found. Returning mock data.")
+            return youtube_mock_results()
+
+        return await asyncio.to_thread(self._search_sync, api_key, query, max_results, date_range)
+
+# Process-wide source registry (order = order of results handed to the ranker)
+# Fetch ample results to ensure we can meet target_count even with failures
+SEARCH_SOURCES: List[SearchSource] = [
+    TavilySource(max_results=20, timeout=float(os.getenv("SEARCH_TIMEOUT_TAVILY", "20"))),
+    YouTubeSource(max_results=10, timeout=float(os.getenv("SEARCH_TIMEOUT_YOUTUBE", "10"))),
+]
+
+def register_source(source: SearchSource):
+    """
+    Add another search backend to the fan-out.
+    """
+    SEARCH_SOURCES.append(source)
+
+async def search_all(query: str, date_range: Optional[Dict[str, str]] = None, sources: Optional[List[SearchSource]] = None, deadline: Optional[float] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Run every source concurrently (through the search cache). Returns {source name: results}.
+    Sources still running at deadline return no results.
+    """
+    sources = SEARCH_SOURCES if sources is None else sources
+    results = await asyncio.gather(*(
+        cached_search(query, date_range, source.name, lambda source=source: source.run(query, date_range, deadline))
+        for source in sources
+    ))
+    return {source.name: res for source, res in zip(sources, results)}
@@ -8,6 +8,20 @@ from youtube_transcript_api.formatters import TextFormatter
 
 from datetime import datetime
 
+def tavily_mock_results():
+    return [{"url": "https://en.wikipedia.org/wiki/Artificial_intelligence", "content": "Mock Result", "score": 0.9}]
+
+def youtube_mock_results():
+    # Use a video that definitely has captions
+    return [{
+        "url": "https://www.youtube.com/watch?v=Ai8xZp3_33g", 
+        "title": "Mock Video (AI)", 
+        "video_id": "Ai8xZp3_33g", 
+        "source": "youtube",
+        "thumbnail": "https://i.ytimg.com/vi/Ai8xZp3_33g/hqdefault.jpg",
+        "description": "Mock description for the video."
+    }]
+
 def tavily_search(query: str, max_results=5, date_range=None):
     """
     Search web using Tavily API. 
@@ -16,7 +30,7 @@ def tavily_search(query: str, max_results=5, date_range=None):
     api_key = os.getenv("TAVILY_API_KEY")
     if not api_key:
         print("Warning: TAVILY_API_KEY not found. Returning mock data.")
-        return [{"url": "https://en.wikipedia.org/wiki/Artificial_intelligence", "content": "Mock Result", "score": 0.9}]
+        return tavily_mock_results()
     
     try:
         client = TavilyClient(api_key=api_key)
@@ -26,51 +40,59 @@ def tavily_search(query: str, max_results=5, date_range=None):
         # To make it "platform agnostic" but inclusive, we can just search normally.
         # But if we want to ensure community sites are candidates, we can add them to the query 
         # or just rely on the high max_results.
-        
-        # Calculate days for max info
-        days = 3 # Default to recent 3 days if no range
-        if date_range and date_range.get("startDate"):
-            try:
-                start_date_str = date_range.get("startDate")
-                start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-                delta = datetime.now() - start_date
-                days = max(1, delta.days + 1) # Ensure at least 1 day
-            except Exception as e:
-                print(f"Error parsing start date: {e}")
-
-        # Use advanced search depth to get more metadata like published_date
-        search_params = {
-            "query": query, 
-            "max_results": max_results,
-            "search_depth": "advanced",
-            "days": days
-        }
-        
-        response = client.search(**search_params)
-        
-        # Debug: Check if published_date is present
-        if response.get("results"):
-            print(f"DEBUG: First result keys: {response['results'][0].keys()}")
-            print(f"DEBUG: First result date: {response['results'][0].get('published_date')}")
-        
-        results = []
-        for r in response.get("results", []):
-            # Check domain to tag source roughly (optional but helpful for reranker)
-            url = r.get("url", "")
-            if any(d in url for d in ["reddit.com", "news.ycombinator.com", "velog.io", "medium.com"]):
-                r["source"] = "community"
-            else:
-                r["source"] = "web"
-                
-            # Ensure content/snippet is preserved
-            if "content" not in r and "snippet" in r:
-                r["content"] = r["snippet"]
-            results.append(r)
-        return results
+        response = client.search(**tavily_search_params(query, max_results, date_range))
+        return parse_tavily_response(response)
     except Exception as e:
         print(f"Tavily search error: {e}")
         return []
 
+def tavily_search_params(query: str, max_results=5, date_range=None):
+    """
+    Build the Tavily search parameters (shared by the sync and async clients).
+    """
+    # Calculate days for max info
+    days = 3 # Default to recent 3 days if no range
+    if date_range and date_range.get("startDate"):
+        try:
+            start_date_str = date_range.get("startDate")
+            start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
+            delta = datetime.now() - start_date
+            days = max(1, delta.days + 1) # Ensure at least 1 day
+        except Exception as e:
+            print(f"Error parsing start date: {e}")
+
+    # Use advanced search depth to get more metadata like published_date
+    return {
+        "query": query, 
+        "max_results": max_results,
+        "search_depth": "advanced",
+        "days": days
+    }
+
+def parse_tavily_response(response):
+    """
+    Tag and normalize raw Tavily results.
+    """
+    # Debug: Check if published_date is present
+    if response.get("results"):
+        print(f"DEBUG: First result keys: {response['results'][0].keys()}")
+        print(f"DEBUG: First result date: {response['results'][0].get('published_date')}")
+    
+    results = []
+    for r in response.get("results", []):
+        # Check domain to tag source roughly (optional but helpful for reranker)
+        url = r.get("url", "")
+        if any(d in url for d in ["reddit.com", "news.ycombinator.com", "velog.io", "medium.com"]):
+            r["source"] = "community"
+        else:
+            r["source"] = "web"
+            
+        # Ensure content/snippet is preserved
+        if "content" not in r and "snippet" in r:
+            r["content"] = r["snippet"]
+        results.append(r)
+    return results
+
 # Removed separate community_search as it is now merged or we just use broad search
 
 
@@ -81,66 +103,68 @@ def youtube_search(query: str, max_results=3, date_range=None):
     api_key = os.getenv("YOUTUBE_API_KEY")
     if not api_key:
         print("Warning: YOUTUBE_API_KEY not found. Returning mock data.")
-        # Use a video that definitely has captions
-        return [{
-            "url": "https://www.youtube.com/watch?v=Ai8xZp3_33g", 
-            "title": "Mock Video (AI)", 
-            "video_id": "Ai8xZp3_33g", 
-            "source": "youtube",
-            "thumbnail": "https://i.ytimg.com/vi/Ai8xZp3_33g/hqdefault.jpg",
-            "description": "Mock description for the video."
-        }]
+        return youtube_mock_results()
 
     try:
         youtube = build('youtube', 'v3', developerKey=api_key)
-        
-        publishedAfter = None
-        publishedBefore = None
-        
-        if date_range:
-            # Convert to RFC 3339 format (YYYY-MM-DDThh:mm:ssZ)
-            s_date = date_range.get("startDate")
-            s_time = date_range.get("startTime", "00:00:00")
-            e_date = date_range.get("endDate")
-            e_time = date_range.get("endTime", "23:59:59")
-            
-            if s_date:
-                publishedAfter = f"{s_date}T{s_time}Z"
-            if e_date:
-                publishedBefore = f"{e_date}T{e_time}Z"
-
-        request = youtube.search().list(
-            q=query,
-            part='snippet',
-            type='video',
-            maxResults=max_results,
-            publishedAfter=publishedAfter,
-            publishedBefore=publishedBefore
-        )
+        request = youtube.search().list(**youtube_search_params(query, max_results, date_range))
         response = request.execute()
-        
-        results = []
-        for item in response.get("items", []):
-            video_id = item["id"]["videoId"]
-            snippet = item["snippet"]
-            
-            # Extract high res thumbnail if available, else default
-            thumbnails = snippet.get("thumbnails", {})
-            thumb_url = thumbnails.get("high", {}).get("url") or thumbnails.get("medium", {}).get("url") or thumbnails.get("default", {}).get("url")
-            
-            results.append({
-                "url": f"https://www.youtube.com/watch?v={video_id}",
-                "title": snippet["title"],
-                "video_id": video_id,
-                "source": "youtube",
-                "thumbnail": thumb_url,
-                "description": snippet.get("description", "")
-            })
-        return results
+        return parse_youtube_response(response)
     except Exception as e:
         print(f"YouTube search error: {e}")
         return []
 
+def youtube_search_params(query: str, max_results=3, date_range=None):
+    """
+    Build the YouTube search().list() parameters.
+    """
+    publishedAfter = None
+    publishedBefore = None
+    
+    if date_range:
+        # Convert to RFC 3339 format (YYYY-MM-DDThh:mm:ssZ)
+        s_date = date_range.get("startDate")
+        s_time = date_range.get("startTime", "00:00:00")
+        e_date = date_range.get("endDate")
+        e_time = date_range.get("endTime", "23:59:59")
+        
+        if s_date:
+            publishedAfter = f"{s_date}T{s_time}Z"
+        if e_date:
+            publishedBefore = f"{e_date}T{e_time}Z"
+
+    return {
+        "q": query,
+        "part": 'snippet',
+        "type": 'video',
+        "maxResults": max_results,
+        "publishedAfter": publishedAfter,
+        "publishedBefore": publishedBefore
+    }
+
+def parse_youtube_response(response):
+    """
+    Convert a YouTube search response into result dicts.
+    """
+    results = []
+    for item in response.get("items", []):
+        video_id = item["id"]["videoId"]
+        snippet = item["snippet"]
+        
+        # Extract high res thumbnail if available, else default
+        thumbnails = snippet.get("thumbnails", {})
+        thumb_url = thumbnails.get("high", {}).get("url") or thumbnails.get("medium", {}).get("url") or thumbnails.get("default", {}).get("url")
+        
+        results.append({
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+            "title": snippet["title"],
+            "video_id": video_id,
+            "source": "youtube",
+            "thumbnail": thumb_url,
+            "description": snippet.get("description", "")
+        })
+    return results
+
 def fetch_web_content(url: str):
     """
     Fetch text content and metadata from a URL.
@@ -0,0 +1,153 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# USD per 1M (prompt, completion) tokens, matched by model-name prefix (longest first).
+# Override/extend with LLM_PRICES='{"my-model": [0.5, 1.5]}'.
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4.1-mini": (0.4, 1.6),
+    "gpt-4.1": (2.0, 8.0),
+}
+MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+def price_for(model: str):
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_PRICES[prefix]
+    return None
+
+# The tracker of the job running in the current context (asyncio tasks inherit it)
+_current_tracker: ContextVar[Optional["UsageTracker"]] = ContextVar("usage_tracker", default=None)
+
+class UsageTracker(BaseCallbackHandler):
+    """
+    Per-job usage accounting.
+    As a LangChain callback it collects token usage of every chat model call (attributed to
+    the LangGraph node it ran in) and wall time per node. Fetch bytes and cache lookups are
+    reported through record_fetch / record_cache by whichever tracker is current (track_usage).
+    """
+    run_inline = True # Plain counters: no need to hop to the executor
+
+    def __init__(self):
+        self.started = time.time()
+        self.llm = {}
+        self.stages = {}
+        self.fetch = {"pages": 0, "bytes": 0}
+        self.cache = {}
+        self._llm_runs = {}
+        self._node_runs = {}
+
+    # LangChain callbacks
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model = (kwargs.get("invocation_params") or {}).get("model_name") or (kwargs.get("invocation_params") or {}).get("model") or ""
+        self._llm_runs[run_id] = ((metadata or {}).get("langgraph_node", "other"), model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        node, model = self._llm_runs.pop(run_id, ("other", ""))
+        prompt = completion = 0
+        usage = None
+        try:
+            usage = response.generations[0][0].message.usage_metadata
+        except (IndexError, AttributeError):
+            pass
+        if usage:
+            prompt, completion = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        else:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt, completion = token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+        model = (response.llm_output or {}).get("model_name") or model
+
+        stats = self.llm.setdefault(node, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt
+        stats["completion_tokens"] += completion
+        price = price_for(model)
+        if price:
+            stats["cost_usd"] += (prompt * price[0] + completion * price[1]) / 1_000_000
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        node, _ = self._llm_runs.pop(run_id, ("other", ""))
+        stats = self.llm.setdefault(node, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+        stats["errors"] = stats.get("errors", 0) + 1
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node's own run, not the runnables nested inside it
+        if node and kwargs.get("name") == node:
+            self._node_runs[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_node(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_node(run_id)
+
+    def _end_node(self, run_id):
+        node_run = self._node_runs.pop(run_id, None)
+        if node_run:
+            node, start = node_run
+            self.stages[node] = self.stages.get(node, 0.0) + time.perf_counter() - start
+
+    # Direct reports
+
+    def record_fetch(self, nbytes: int):
+        self.fetch["pages"] += 1
+        self.fetch["bytes"] += nbytes
+
+    def record_cache(self, name: str, counter: str, n: int = 1):
+        counters = self.cache.setdefault(name, {})
+        counters[counter] = counters.get(counter, 0) + n
+
+    def summary(self) -> Dict[str, Any]:
+        totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+        for stats in self.llm.values():
+            for key in totals:
+                totals[key] += stats[key]
+        totals["total_tokens"] = totals["prompt_tokens"] + totals["completion_tokens"]
+        totals["cost_usd"] = round(totals["cost_usd"], 6)
+
+        cache = {}
+        for name, counters in self.cache.items():
+            lookups = counters.get("hits", 0) + counters.get("misses", 0)
+            cache[name] = dict(counters, hit_rate=round(counters.get("hits", 0) / lookups, 3) if lookups else 0.0)
+
+        return {
+            "llm": dict(totals, by_node={node: dict(stats, cost_usd=round(stats["cost_usd"], 6)) for node, stats in self.llm.items()}),
+            "stages": {node: round(seconds, 3) for node, seconds in self.stages.items()},
+            "wall_seconds": round(time.time() - self.started, 3),
+            "fetch": dict(self.fetch),
+            "cache": cache,
+        }
+
+@contextmanager
+def track_usage(tracker: UsageTracker):
+    """
+    Make tracker the current job's tracker for fetch/cache reporting in this context.
+    """
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        try:
+            _current_tracker.reset(token)
+        except ValueError: # Closed from another context (e.g. an abandoned stream generator)
+            pass
+
+def record_fetch(nbytes: int):
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.record_fetch(nbytes)
+
+def record_cache(name: str, counter: str, n: int = 1):
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.record_cache(name, counter, n)
@@ -0,0 +1,114 @@
+"""
+Benchmark the single-pass page extractor against the old BeautifulSoup extraction.
+
+Usage (from the project root):
+    python bench/extraction/bench_extract.py [--rounds 20] [--backend lxml|html.parser]
+
+Reports per-page throughput for both implementations and output parity
+(exact text match, text similarity ratio, metadata match).
+The checked-in corpus is synthetic (generated page shapes, not saved real pages): drop
+saved pages (*.html) into bench/extraction/corpus/ to extend it, and check parity there
+before switching HTML_PARSER_BACKEND to lxml.
+"""
+import sys
+import time
+import argparse
+from difflib import SequenceMatcher
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(BASE_DIR))
+
+from bs4 import BeautifulSoup
+from agent.utils.html_extract import extract_page, EXTRACT_MAX_CHARS
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+
+def baseline_extract(html: str):
+    """
+    The previous fetch_web_content_async parsing code, verbatim.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    tags = soup.find_all(['p', 'h1', 'h2', 'h3', 'li'])
+    text = ' '.join([t.get_text() for t in tags])
+
+    thumbnail = ""
+    description = ""
+
+    og_image = soup.find("meta", property="og:image")
+    if og_image:
+        thumbnail = og_image.get("content", "")
+
+    meta_desc = soup.find("meta", attrs={"name": "description"}) or soup.find("meta", property="og:description")
+    if meta_desc:
+        description = meta_desc.get("content", "")
+
+    published_date = ""
+    date_metas = [
+        {"property": "article:published_time"},
+        {"name": "date"},
+        {"name": "pubdate"},
+        {"name": "original-publication-date"},
+        {"name": "publication_date"},
+        {"property": "og:published_time"}
+    ]
+
+    for meta_attr in date_metas:
+        tag = soup.find("meta", attrs=meta_attr)
+        if tag and tag.get("content"):
+            published_date = tag.get("content").split("T")[0]
+            break
+
+    return {
+        "text": text[:EXTRACT_MAX_CHARS],
+        "thumbnail": thumbnail,
+        "description": description,
+        "published_date": published_date
+    }
+
+def timed(fn, html, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn(html)
+    return (time.perf_counter() - start) / rounds, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Page extraction benchmark")
+    parser.add_argument("--rounds", type=int, default=20, help="Iterations per page (default: 20)")
+    parser.add_argument("--backend", type=str, default=None, choices=["lxml", "html.parser"], help="Extractor parser backend")
+    args = parser.parse_args()
+
+    pages = sorted(CORPUS_DIR.glob("*.html"))
+    if not pages:
+        print(f"No pages found in {CORPUS_DIR}")
+        return
+
+    header = f"{'page':<28}{'KB':>8}{'bs4 ms':>10}{'new ms':>10}{'speedup':>9}{'text ==':>9}{'sim':>7}{'meta ==':>9}"
+    print(header)
+    print("-" * len(header))
+
+    total_old = total_new = total_bytes = 0.0
+    for page in pages:
+        html = page.read_text(encoding="utf-8", errors="replace")
+        old_t, old = timed(baseline_extract, html, args.rounds)
+        new_t, new = timed(lambda h: extract_page(h, backend=args.backend), html, args.rounds)
+
+        same_text = old["text"] == new["text"]
+        similarity = SequenceMatcher(None, old["text"], new["text"], autojunk=False).quick_ratio()
+        same_meta = all(old[k] == new[k] for k in ("thumbnail", "description", "published_date"))
+
+        total_old += old_t
+        total_new += new_t
+        total_bytes += len(html.encode("utf-8"))
+        print(f"{page.name:<28}{len(html) / 1024:>8.1f}{old_t * 1000:>10.2f}{new_t * 1000:>10.2f}{old_t / new_t:>8.1f}x"
+              f"{str(same_text):>9}{similarity:>7.3f}{str(same_meta):>9}")
+
+    print("-" * len(header))
+    mb = total_bytes / (1024 * 1024)
+    print(f"corpus: {len(pages)} pages, {mb:.2f} MB")
+    print(f"bs4:  {total_old * 1000:.1f} ms/corpus ({mb / total_old:.1f} MB/s)")
+    print(f"new:  {total_new * 1000:.1f} ms/corpus ({mb / total_new:.1f} MB/s), {total_old / total_new:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
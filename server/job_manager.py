@@ -3,47 +3,60 @@ from typing import Dict, Any, Optional
 from enum import Enum
 from datetime import datetime
 
+from server.job_store import create_job_store
+
 class JobStatus(str, Enum):
     PENDING = "pending"
     IN_PROGRESS = "in_progress"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 class JobManager:
-    def __init__(self):
-        # In-memory storage. In production, use Redis or Database.
-        self._jobs: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, store=None):
+        # Pluggable storage (JOB_STORE=memory|sqlite); finished jobs expire after JOB_TTL
+        self._store = store if store is not None else create_job_store()
+
+    @property
+    def store(self):
+        return self._store
 
     def create_job(self) -> str:
         """Create a new job and return its ID."""
         job_id = str(uuid.uuid4())
-        self._jobs[job_id] = {
+        self._store.create({
             "id": job_id,
             "status": JobStatus.PENDING,
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat(),
             "result": None,
-            "error": None
-        }
+            "error": None,
+            "usage": None
+        })
         return job_id
 
-    def update_job(self, job_id: str, status: JobStatus, result: Optional[Any] = None, error: Optional[str] = None):
+    def update_job(self, job_id: str, status: JobStatus, result: Optional[Any] = None, error: Optional[str] = None, usage: Optional[Dict[str, Any]] = None):
         """Update the status and result of a job."""
-        if job_id not in self._jobs:
-            return # Or raise exception
-        
-        self._jobs[job_id]["status"] = status
-        self._jobs[job_id]["updated_at"] = datetime.now().isoformat()
-        
+        fields = {"status": status, "updated_at": datetime.now().isoformat()}
+
         if result is not None:
-            self._jobs[job_id]["result"] = result
-        
+            fields["result"] = result
+
         if error is not None:
-            self._jobs[job_id]["error"] = error
+            fields["error"] = error
+
+        if usage is not None:
+            fields["usage"] = usage
+
+        self._store.update(job_id, fields) # Unknown (or expired) jobs are ignored
+
+    def cancel_job(self, job_id: str) -> bool:
+        """Mark a job cancelled unless it has already finished."""
+        return self._store.cancel(job_id)
 
     def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve job details."""
-        return self._jobs.get(job_id)
+        return self._store.get(job_id)
 
 # Global instance
 job_manager = JobManager()
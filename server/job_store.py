@@ -0,0 +1,395 @@
+import os
+import json
+import time
+import zlib
+import socket
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from agent.utils.cache import CACHE_DIR
+
+# Finished (completed/failed/cancelled) jobs are evicted this many seconds after they finish
+JOB_TTL = float(os.getenv("JOB_TTL", str(6 * 3600)))
+# Memory backend: most jobs kept (least recently used finished jobs go first)
+JOB_MAX_ENTRIES = int(os.getenv("JOB_MAX_ENTRIES", "1000"))
+# Results larger than this (bytes of JSON) are stored zlib-compressed
+JOB_COMPRESS_MIN_BYTES = int(os.getenv("JOB_COMPRESS_MIN_BYTES", "2048"))
+# A claimed job whose worker hasn't sent a heartbeat for this long is handed to another worker
+JOB_CLAIM_TIMEOUT = float(os.getenv("JOB_CLAIM_TIMEOUT", "120"))
+
+# Unfinished jobs with no update (or worker heartbeat) for this long are failed as abandoned
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "3600"))
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+def encode_result(result: Any) -> Optional[bytes]:
+    """
+    Serialize a job result; reports are highly repetitive text and shrink several-fold.
+    The first byte tags the encoding ("j" = JSON, "z" = zlib-compressed JSON).
+    """
+    if result is None:
+        return None
+    payload = json.dumps(result, ensure_ascii=False, default=str).encode("utf-8")
+    if len(payload) >= JOB_COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(payload, 6)
+    return b"j" + payload
+
+def decode_result(blob: Optional[bytes]) -> Any:
+    if blob is None:
+        return None
+    payload = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return json.loads(payload)
+
+class MemoryJobStore:
+    """
+    In-process job store: an LRU of job records with TTL eviction of finished jobs.
+    Results are kept encoded (compressed when large) and decoded on read.
+    Running jobs are never evicted for size; the cap only pushes out finished ones.
+    """
+    def __init__(self, ttl: float = JOB_TTL, max_entries: int = JOB_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, record: Dict[str, Any]):
+        with self._lock:
+            self._jobs[record["id"]] = dict(record, result=encode_result(record.get("result")), finished_at=None)
+            self._evict()
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            if job["finished_at"] is not None and fields.get("status", job["status"]) != job["status"]:
+                return False # Finished (e.g. cancelled) jobs keep their final status
+            if "result" in fields:
+                fields = dict(fields, result=encode_result(fields["result"]))
+            job.update(fields)
+            if job["status"] in FINISHED_STATUSES and job["finished_at"] is None:
+                job["finished_at"] = time.time()
+            self._jobs.move_to_end(job_id)
+            return True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if self._expired(job, time.time()):
+                del self._jobs[job_id]
+                return None
+            self._jobs.move_to_end(job_id)
+            record = {k: v for k, v in job.items() if k != "finished_at"}
+        record["result"] = decode_result(record["result"])
+        return record
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Mark a pending / in-progress job cancelled. False if it is unknown or already finished.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["finished_at"] is not None:
+                return False
+            job.update(status="cancelled", updated_at=datetime.now().isoformat(), finished_at=time.time())
+            return True
+
+    def _expired(self, job: Dict[str, Any], now: float) -> bool:
+        return job["finished_at"] is not None and self.ttl and job["finished_at"] + self.ttl <= now
+
+    def _evict(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items() if self._expired(job, now)]:
+            del self._jobs[job_id]
+        overflow = len(self._jobs) - self.max_entries
+        if overflow > 0:
+            # Oldest-touched finished jobs first
+            victims = [job_id for job_id, job in self._jobs.items() if job["finished_at"] is not None][:overflow]
+            for job_id in victims:
+                del self._jobs[job_id]
+
+    def __len__(self):
+        return len(self._jobs)
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError: # e.g. PermissionError: alive, owned by another user
+        pass
+    return True
+
+class SqliteJobStore:
+    """
+    Durable job store on SQLite (WAL): jobs survive restarts and can be shared by
+    several processes on one host. Lookups are primary-key reads; results are stored
+    as encoded blobs. Finished jobs past their TTL are purged every PURGE_EVERY writes.
+    It doubles as the shared work queue for out-of-process workers (server/worker.py):
+    enqueued jobs carry their graph inputs and are claimed atomically, oldest first.
+    """
+    PURGE_EVERY = 50
+
+    def __init__(self, path: Optional[Path] = None, ttl: float = JOB_TTL):
+        self.ttl = ttl
+        self.path = Path(path) if path else Path(os.getenv("JOB_DB_PATH", str(CACHE_DIR / "jobs.sqlite3")))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                finished_at REAL,
+                result BLOB,
+                error TEXT,
+                usage TEXT
+            )"""
+        )
+        # Work queue columns (added to stores created before the shared queue existed)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("inputs", "TEXT"), ("enqueued_at", "REAL"), ("claimed_by", "TEXT"), ("claimed_at", "REAL"), ("started_at", "REAL"), ("owner", "TEXT")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, enqueued_at)")
+
+        # Process that created a job and runs it in-process (local executor): "host:pid"
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._fail_orphans()
+
+    def create(self, record: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at, result, error, usage, owner) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (record["id"], str(record["status"].value if hasattr(record["status"], "value") else record["status"]),
+                 record["created_at"], record["updated_at"], encode_result(record.get("result")),
+                 record.get("error"), self._dump(record.get("usage")), self.owner)
+            )
+            self._wrote()
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> bool:
+        columns, values = [], []
+        for key, value in fields.items():
+            if key == "status":
+                value = str(value.value if hasattr(value, "value") else value)
+                if value in FINISHED_STATUSES:
+                    columns.append("finished_at = COALESCE(finished_at, ?)")
+                    values.append(time.time())
+                    columns.append("inputs = NULL") # No longer needed once the job is done
+            elif key == "result":
+                value = encode_result(value)
+            elif key == "usage":
+                value = self._dump(value)
+            columns.append(f"{key} = ?")
+            values.append(value)
+        where, params = "id = ?", [job_id]
+        if "status" in fields:
+            # Finished (e.g. cancelled) jobs keep their final status
+            where += " AND (finished_at IS NULL OR status = ?)"
+            params.append(str(fields["status"].value if hasattr(fields["status"], "value") else fields["status"]))
+        with self._lock:
+            cursor = self._conn.execute(f"UPDATE jobs SET {', '.join(columns)} WHERE {where}", (*values, *params))
+            self._wrote()
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, created_at, updated_at, finished_at, result, error, usage FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, created_at, updated_at, finished_at, result, error, usage = row
+        if finished_at is not None and self.ttl and finished_at + self.ttl <= time.time():
+            return None # Purged on a later write
+        return {
+            "id": job_id,
+            "status": status,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "result": decode_result(result),
+            "error": error,
+            "usage": json.loads(usage) if usage else None
+        }
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Mark a pending / in-progress job cancelled (a worker running it notices on its next
+        heartbeat). False if it is unknown or already finished.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """UPDATE jobs SET status = 'cancelled', updated_at = ?, finished_at = ?, inputs = NULL
+                WHERE id = ? AND finished_at IS NULL""",
+                (datetime.now().isoformat(), now, job_id)
+            )
+            self._wrote()
+        return cursor.rowcount > 0
+
+    # Shared work queue
+
+    def enqueue(self, job_id: str, inputs: Dict[str, Any]):
+        """
+        Make a pending job claimable by workers.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET inputs = ?, enqueued_at = ? WHERE id = ?",
+                (json.dumps(inputs, ensure_ascii=False), time.time(), job_id)
+            )
+
+    def claim(self, worker_id: str, claim_timeout: float = JOB_CLAIM_TIMEOUT) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Atomically take the oldest queued job (or one whose worker stopped sending heartbeats)
+        and mark it in progress. Returns (job_id, inputs) or None when the queue is empty.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """UPDATE jobs SET status = 'in_progress', claimed_by = ?, claimed_at = ?, started_at = ?, updated_at = ?
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE inputs IS NOT NULL AND (status = 'pending' OR (status = 'in_progress' AND claimed_at < ?))
+                    ORDER BY enqueued_at LIMIT 1
+                )
+                RETURNING id, inputs""",
+                (worker_id, now, now, datetime.now().isoformat(), now - claim_timeout)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """
+        Renew a claim. False if the job has been cancelled, reclaimed by another worker or is gone.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET claimed_at = ? WHERE id = ? AND claimed_by = ? AND status = 'in_progress'",
+                (time.time(), job_id, worker_id)
+            )
+        return cursor.rowcount > 0
+
+    def release(self, job_id: str, worker_id: str):
+        """
+        Put a claimed job back in the queue (its worker is shutting down).
+        """
+        with self._lock:
+            self._conn.execute(
+                """UPDATE jobs SET status = 'pending', claimed_by = NULL, claimed_at = NULL, started_at = NULL
+                WHERE id = ? AND claimed_by = ? AND status = 'in_progress'""",
+                (job_id, worker_id)
+            )
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'pending' AND inputs IS NOT NULL"
+            ).fetchone()[0]
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """
+        1-based position of a queued job, or None if it isn't waiting.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT COUNT(*) FROM jobs AS ahead, jobs AS job
+                WHERE job.id = ? AND job.status = 'pending' AND job.inputs IS NOT NULL
+                AND ahead.status = 'pending' AND ahead.inputs IS NOT NULL AND ahead.enqueued_at <= job.enqueued_at""",
+                (job_id,)
+            ).fetchone()
+        return row[0] or None
+
+    def queue_stats(self, recent: int = 20) -> Dict[str, Any]:
+        """
+        Jobs currently claimed and the mean run time of the most recent finished runs.
+        """
+        with self._lock:
+            running = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'in_progress' AND claimed_by IS NOT NULL"
+            ).fetchone()[0]
+            avg_duration = self._conn.execute(
+                """SELECT AVG(finished_at - started_at) FROM (
+                    SELECT finished_at, started_at FROM jobs
+                    WHERE started_at IS NOT NULL AND finished_at IS NOT NULL
+                    ORDER BY finished_at DESC LIMIT ?
+                )""",
+                (recent,)
+            ).fetchone()[0]
+        return {"running": running, "avg_duration": avg_duration}
+
+    def _dump(self, value: Any) -> Optional[str]:
+        return json.dumps(value, ensure_ascii=False) if value is not None else None
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._fail_stale()
+            if self.ttl:
+                self._conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at <= ?", (time.time() - self.ttl,))
+
+    def _fail(self, job_ids, error: str):
+        now = time.time()
+        self._conn.executemany(
+            "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ?, inputs = NULL WHERE id = ? AND finished_at IS NULL",
+            [(error, datetime.now().isoformat(), now, job_id) for job_id in job_ids]
+        )
+
+    def _fail_orphans(self):
+        """
+        On startup: fail jobs that a dead process on this host was running in-process.
+        Jobs queued for remote workers (inputs set) are left to the workers / claim timeout.
+        """
+        host = socket.gethostname()
+        orphans = []
+        for job_id, owner in self._conn.execute("SELECT id, owner FROM jobs WHERE finished_at IS NULL AND inputs IS NULL"):
+            owner_host, _, pid = (owner or "").rpartition(":")
+            if not pid.isdigit() or (owner_host == host and not _process_alive(int(pid))):
+                orphans.append(job_id)
+        if orphans:
+            self._fail(orphans, "Interrupted by a server restart")
+            print(f"--- Job Store: Failed {len(orphans)} jobs orphaned by a restart ---")
+
+    def _fail_stale(self):
+        # Unfinished jobs nobody has touched for JOB_STALE_AFTER (e.g. their server died on another host)
+        now = time.time()
+        cutoff = datetime.fromtimestamp(now - JOB_STALE_AFTER).isoformat()
+        stale = [row[0] for row in self._conn.execute(
+            "SELECT id FROM jobs WHERE finished_at IS NULL AND updated_at < ? AND (claimed_at IS NULL OR claimed_at < ?)",
+            (cutoff, now - JOB_STALE_AFTER)
+        )]
+        if stale:
+            self._fail(stale, "Abandoned (no progress)")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_job_store(kind: Optional[str] = None):
+    """
+    Job store selected by JOB_STORE: "memory" (default, per process) or "sqlite" (durable).
+    """
+    kind = (kind or os.getenv("JOB_STORE", "memory")).lower()
+    if kind == "sqlite":
+        return SqliteJobStore()
+    if kind == "memory":
+        return MemoryJobStore()
+    raise ValueError(f"Unknown JOB_STORE: {kind}")
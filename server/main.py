@@ -2,25 +2,47 @@ import sys
 from pathlib import Path
 import json
 import asyncio
+from contextlib import asynccontextmanager
 from typing import Optional, Dict, Any
 
 # Add project root to python path to allow importing from agent
 BASE_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(BASE_DIR))
 
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
-from agent.graph import create_graph
-from agent.utils.input_handler import create_graph_inputs
-from server.job_manager import job_manager, JobStatus
-
-# Load env variables
+# Load env variables (before the imports below read their settings)
 load_dotenv()
 
-app = FastAPI(title="Web Research Agent API")
+from agent.utils.input_handler import create_graph_inputs
+from agent.utils.http_client import init_http_session, close_http_session
+from agent.utils.llm import warm_up_llms
+from agent.utils.usage import UsageTracker, track_usage
+from server.runner import graph, run_research_background
+from agent.utils.llm_scheduler import PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from server.job_manager import job_manager, JobStatus
+from server.research_queue import research_queue, QueueFull
+from agent.utils.deadline import hard_timeout
+
+# Seconds between checks for a disconnected SSE client
+STREAM_DISCONNECT_POLL = 1.0
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared pooled HTTP client for every research job in this process
+    await init_http_session()
+    # Build the shared LLM clients and open their connection pool before the first request
+    await warm_up_llms()
+    # Fixed pool of research workers for async-mode jobs
+    research_queue.start(run_research_background)
+    yield
+    await research_queue.stop()
+    await close_http_session()
+
+app = FastAPI(title="Web Research Agent API", lifespan=lifespan)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -32,8 +54,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize the graph
-graph = create_graph()
+class StreamSlotResponse(StreamingResponse):
+    """
+    SSE response that holds one of the research queue's stream slots (taken by the
+    endpoint) and gives it back however the response ends, including a client that
+    disconnects before the body generator ever starts.
+    """
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            research_queue.release_stream()
 
 class ResearchRequest(BaseModel):
     query: str = Field(..., description="Research topic")
@@ -44,30 +75,14 @@ class ResearchRequest(BaseModel):
     start_time: Optional[str] = Field(default=None, description="Start time (HH:MM:SS)")
     end_time: Optional[str] = Field(default=None, description="End time (HH:MM:SS)")
     count: int = Field(default=5, description="Target number of summaries")
+    concurrency: int = Field(default=5, ge=1, le=20, description="Max concurrent content fetches for this job")
+    pipeline: bool = Field(default=False, description="Summarize each source as soon as it is extracted")
+    batch: bool = Field(default=True, description="Summarize short sources several to an LLM request")
+    timeout: Optional[float] = Field(default=None, gt=0, description="Seconds the research may take; near the deadline the report is built from the summaries done so far")
     mode: str = Field(default="stream", pattern="^(stream|async)$", description="Execution mode: 'stream' (SSE) or 'async' (polling)")
 
-async def run_research_background(job_id: str, inputs: Dict[str, Any]):
-    """
-    Executes the research graph in the background and updates job status.
-    """
-    try:
-        job_manager.update_job(job_id, JobStatus.IN_PROGRESS)
-        
-        # Invoke the graph (await the result)
-        result = await graph.ainvoke(inputs)
-        
-        # The result typically contains the 'report' key or the final state
-        # We'll save the whole result for now, or just the report if preferred
-        final_report = result.get("report", "No report generated")
-        
-        job_manager.update_job(job_id, JobStatus.COMPLETED, result={"report": final_report})
-        
-    except Exception as e:
-        print(f"Error processing job {job_id}: {e}")
-        job_manager.update_job(job_id, JobStatus.FAILED, error=str(e))
-
 @app.post("/research")
-async def research_endpoint(request: ResearchRequest, background_tasks: BackgroundTasks):
+async def research_endpoint(request: ResearchRequest, http_request: Request):
     """
     Initiates research. Supports 'stream' (SSE) and 'async' (polling) modes.
     """
@@ -79,42 +94,67 @@ async def research_endpoint(request: ResearchRequest, background_tasks: Backgrou
         end_date=request.end_date,
         start_time=request.start_time,
         end_time=request.end_time,
-        count=request.count
+        count=request.count,
+        concurrency=request.concurrency,
+        pipeline=request.pipeline,
+        batch_summaries=request.batch,
+        timeout=request.timeout,
+        # A client is waiting on the SSE stream; polled jobs can yield LLM capacity to it
+        priority=PRIORITY_INTERACTIVE if request.mode == "stream" else PRIORITY_BATCH
     )
 
+    try:
+        if request.mode == "stream":
+            research_queue.acquire_stream() # Stream runs have their own reserved slots
+        else:
+            await research_queue.check_capacity()
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
     if request.mode == "stream":
         async def event_generator():
+            # Token, timing, fetch and cache accounting for this job
+            tracker = UsageTracker()
+            events = asyncio.Queue()
+
+            async def produce():
+                # Runs the graph in its own task so a disconnect can cancel it (and every
+                # fetch / LLM call under it) even while no event is being sent
+                try:
+                    # Use astream_events v2 for granular updates (including LLM outputs)
+                    with track_usage(tracker):
+                        async with asyncio.timeout(hard_timeout(inputs.get("deadline"))):
+                            async for event in graph.astream_events(inputs, version="v2", config={"callbacks": [tracker]}):
+                                events.put_nowait(event)
+                except TimeoutError:
+                    events.put_nowait(Exception("Deadline exceeded"))
+                except Exception as e:
+                    events.put_nowait(e)
+                finally:
+                    events.put_nowait(None)
+
+            async def watch_disconnect():
+                while not await http_request.is_disconnected():
+                    await asyncio.sleep(STREAM_DISCONNECT_POLL)
+                print("--- Stream: Client disconnected, cancelling research ---")
+                producer.cancel()
+
+            producer = asyncio.create_task(produce())
+            watcher = asyncio.create_task(watch_disconnect())
             try:
-                # Use astream_events v2 for granular updates (including LLM outputs)
-                async for event in graph.astream_events(inputs, version="v2"):
+                while (event := await events.get()) is not None:
+                    if isinstance(event, Exception):
+                        error_data = json.dumps({"error": str(event)}, ensure_ascii=False)
+                        yield f"data: {error_data}\n\n"
+                        continue
+
                     kind = event["event"]
-                    
-                    # 1. Custom handling for individual LLM outputs (Summaries)
-                    if kind == "on_chat_model_end":
-                        # We only want summaries, not other LLM calls (if any)
-                        # We can try to infer context or just process all valid JSONs
-                        data = event["data"]["output"].content
-                        
-                        # Try to detect if it's a summary result (JSON structure)
-                        # This is a bit loose but effective for streaming visibility
-                        try:
-                            # Verify it looks like our summary structure
-                            # It might be a Raw string if regex failed inside agent, but usually it's JSON string
-                            # The agent returns a list of strings, but here we catch the raw LLM output
-                            # The LLM output is what we want to stream immediately
-                            
-                            # Clean it up slightly for the client
-                            cleaned_data = data.strip()
-                            if cleaned_data.startswith("```json"):
-                                cleaned_data = cleaned_data[7:-3]
-                            elif cleaned_data.startswith("```"):
-                                cleaned_data = cleaned_data[3:-3]
-                                
-                            # Send as a special event type for the client to render incrementally
-                            payload = json.dumps({"custom_summary": cleaned_data}, ensure_ascii=False)
-                            yield f"data: {payload}\n\n"
-                        except:
-                            pass
+
+                    # 1. Individual summaries, dispatched by the summarization/pipeline nodes as they finish
+                    if kind == "on_custom_event" and event["name"] == "summary":
+                        # Send as a special event type for the client to render incrementally
+                        payload = json.dumps({"custom_summary": event["data"]}, ensure_ascii=False)
+                        yield f"data: {payload}\n\n"
 
                     # 2. Standard State Updates (Node completions)
                     # on_chain_end usually corresponds to a node finishing in LangGraph
@@ -127,31 +167,59 @@ async def research_endpoint(request: ResearchRequest, background_tasks: Backgrou
                              if any(k in output for k in ["search_results", "contents", "summaries", "report"]):
                                  payload = json.dumps(output, default=str, ensure_ascii=False)
                                  yield f"data: {payload}\n\n"
-
-            except Exception as e:
-                error_data = json.dumps({"error": str(e)}, ensure_ascii=False)
-                yield f"data: {error_data}\n\n"
+            finally:
+                # Also reached when the response is torn down mid-stream
+                watcher.cancel()
+                producer.cancel()
+                await asyncio.gather(producer, watcher, return_exceptions=True)
+            # Final accounting for the job, sent before the end-of-stream marker
+            usage_data = json.dumps({"usage": tracker.summary()}, ensure_ascii=False)
+            yield f"data: {usage_data}\n\n"
             yield "data: [DONE]\n\n"
 
-        return StreamingResponse(event_generator(), media_type="text/event-stream")
+        return StreamSlotResponse(event_generator(), media_type="text/event-stream")
     
     elif request.mode == "async":
-        job_id = job_manager.create_job()
-        background_tasks.add_task(run_research_background, job_id, inputs)
+        # Job store calls can wait on the SQLite lock (shared with workers and other replicas):
+        # run them in a thread so they don't stall the SSE streams on this loop
+        job_id = await asyncio.to_thread(job_manager.create_job)
+        try:
+            await research_queue.submit(job_id, inputs)
+        except QueueFull as e:
+            # Another replica filled the shared queue since check_capacity: don't leave the job pending
+            await asyncio.to_thread(job_manager.update_job, job_id, JobStatus.FAILED, error=str(e))
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
         return {
             "job_id": job_id, 
             "status": JobStatus.PENDING, 
-            "message": "Research started in background. Check status at GET /jobs/{job_id}"
+            **(await research_queue.position(job_id) or {}),
+            "message": "Research queued. Check status at GET /jobs/{job_id}"
         }
 
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancels a queued or running async job. Its in-flight fetches and LLM calls are cancelled.
+    """
+    job = await asyncio.to_thread(job_manager.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not await asyncio.to_thread(job_manager.cancel_job, job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    research_queue.cancel(job_id)
+    return {"job_id": job_id, "status": JobStatus.CANCELLED}
+
 @app.get("/jobs/{job_id}")
 async def get_job_status(job_id: str):
     """
     Retrieves the status and result of an async job.
     """
-    job = job_manager.get_job(job_id)
+    job = await asyncio.to_thread(job_manager.get_job, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == JobStatus.PENDING:
+        # Still waiting for a worker: where it is in line and when it should start
+        job.update(await research_queue.position(job_id) or {})
     return job
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+import os
+import math
+import time
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Async-mode research jobs run on this many workers; the rest wait in the queue
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", "4"))
+# Submissions beyond this many waiting jobs are rejected with 429
+RESEARCH_QUEUE_MAX = int(os.getenv("RESEARCH_QUEUE_MAX", "50"))
+# Concurrent stream-mode runs, reserved separately from the async workers
+STREAM_MAX_CONCURRENCY = int(os.getenv("STREAM_MAX_CONCURRENCY", "4"))
+# "local": research runs on workers inside the API process; "remote": jobs are left in the
+# shared SQLite job store for out-of-process workers (python -m server.worker)
+RESEARCH_EXECUTOR = os.getenv("RESEARCH_EXECUTOR", "local").lower()
+# Initial guess for a research run's duration (seconds), refined as jobs finish
+RESEARCH_EXPECTED_SECONDS = float(os.getenv("RESEARCH_EXPECTED_SECONDS", "60"))
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Research queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class ResearchQueue:
+    """
+    Admission control for research runs.
+    Async jobs go through a FIFO served by a fixed pool of workers, bounded at max_depth
+    waiting jobs; stream runs take one of their own reserved slots and never queue
+    (an SSE client can't usefully wait). Run durations feed an EWMA used for the
+    queue-position ETA and for Retry-After.
+    """
+    DURATION_SMOOTHING = 0.2
+
+    def __init__(self, workers: int = RESEARCH_WORKERS, max_depth: int = RESEARCH_QUEUE_MAX, stream_slots: int = STREAM_MAX_CONCURRENCY):
+        self.workers = max(1, workers)
+        self.max_depth = max_depth
+        self.stream_slots = max(1, stream_slots)
+        self.avg_duration = RESEARCH_EXPECTED_SECONDS
+        self._queue: Optional[asyncio.Queue] = None
+        self._waiting: List[str] = [] # Job ids in queue order
+        self._tasks: List[asyncio.Task] = []
+        self._active: Dict[str, asyncio.Task] = {} # Running job id -> its task
+        self._running = 0
+        self._streams = 0
+
+    def start(self, run: Callable[[str, Dict[str, Any]], Awaitable[None]]):
+        """
+        Start the worker pool (from the app lifespan). run(job_id, inputs) executes one job.
+        """
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(run)) for _ in range(self.workers)]
+        print(f"--- Research Queue: {self.workers} workers, max depth {self.max_depth}, {self.stream_slots} stream slots ---")
+
+    async def stop(self):
+        running = list(self._active.values()) # Cancelled by their workers; let them record it
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *running, return_exceptions=True)
+        self._tasks = []
+
+    # check_capacity / submit / position / stats are coroutines because the shared queue
+    # answers them from the SQLite store, off the event loop
+
+    async def check_capacity(self):
+        """
+        Raise QueueFull (with a Retry-After estimate) if a new job would be rejected.
+        """
+        if len(self._waiting) >= self.max_depth:
+            raise QueueFull(self._retry_after())
+
+    async def submit(self, job_id: str, inputs: Dict[str, Any]):
+        """
+        Enqueue a job; raises QueueFull when at capacity.
+        """
+        await self.check_capacity()
+        self._waiting.append(job_id)
+        self._queue.put_nowait((job_id, inputs))
+
+    async def _worker(self, run):
+        while True:
+            job_id, inputs = await self._queue.get()
+            if job_id not in self._waiting: # Cancelled while queued
+                self._queue.task_done()
+                continue
+            self._waiting.remove(job_id)
+            self._running += 1
+            started = time.perf_counter()
+            # Run in its own task so that cancel(job_id) stops the job, not the worker
+            task = asyncio.create_task(run(job_id, inputs))
+            self._active[job_id] = task
+            try:
+                await asyncio.wait([task])
+                if not task.cancelled():
+                    if task.exception(): # run() records its own failures; keep the worker alive regardless
+                        print(f"--- Research Queue: job {job_id} crashed: {task.exception()} ---")
+                    else:
+                        # Only complete runs say how long a job takes; cancelled ones would drag the ETA down
+                        self._observe(time.perf_counter() - started)
+            finally:
+                task.cancel() # Only has an effect when the worker itself is being stopped
+                del self._active[job_id]
+                self._running -= 1
+                self._queue.task_done()
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Drop a queued job or cancel a running one (its in-flight fetches and LLM calls
+        are cancelled with it). False if this queue doesn't hold the job.
+        """
+        if job_id in self._waiting:
+            self._waiting.remove(job_id)
+            return True
+        task = self._active.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    def _observe(self, seconds: float):
+        self.avg_duration += self.DURATION_SMOOTHING * (seconds - self.avg_duration)
+
+    def _retry_after(self) -> int:
+        # Roughly when the next slot frees up
+        return max(1, math.ceil(self.avg_duration / self.workers))
+
+    async def position(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Queue position (1-based) and estimated start of a waiting job, or None if it isn't queued.
+        """
+        try:
+            position = self._waiting.index(job_id) + 1
+        except ValueError:
+            return None
+        # Every `workers` jobs ahead (plus the ones running now) cost about one run
+        wait = math.ceil(position / self.workers) * self.avg_duration if self._running >= self.workers else 0.0
+        return self._eta(position, wait)
+
+    def _eta(self, position: int, wait: float) -> Dict[str, Any]:
+        return {
+            "queue_position": position,
+            "estimated_start_seconds": round(wait),
+            "estimated_start_at": (datetime.now() + timedelta(seconds=wait)).isoformat()
+        }
+
+    def acquire_stream(self):
+        """
+        Take a reserved stream slot; raises QueueFull if all are in use.
+        """
+        if self._streams >= self.stream_slots:
+            raise QueueFull(self._retry_after())
+        self._streams += 1
+
+    def release_stream(self):
+        self._streams -= 1
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "waiting": len(self._waiting),
+            "running": self._running,
+            "workers": self.workers,
+            "streams": self._streams,
+            "stream_slots": self.stream_slots,
+            "avg_duration_seconds": round(self.avg_duration, 1)
+        }
+
+class SharedResearchQueue(ResearchQueue):
+    """
+    Remote executor: async jobs are enqueued in the shared SQLite job store and run by
+    worker processes (server/worker.py), so any API replica can accept and poll them.
+    Depth, positions and run times come from the store; stream runs stay in-process.
+    """
+    def __init__(self, store, max_depth: int = RESEARCH_QUEUE_MAX, stream_slots: int = STREAM_MAX_CONCURRENCY):
+        super().__init__(workers=1, max_depth=max_depth, stream_slots=stream_slots)
+        self.store = store
+
+    def start(self, run):
+        print(f"--- Research Queue: remote workers via {self.store.path}, max depth {self.max_depth}, {self.stream_slots} stream slots ---")
+
+    async def stop(self):
+        pass
+
+    async def check_capacity(self):
+        # Store calls wait on the SQLite lock shared with workers and other replicas: run them in a thread
+        if await asyncio.to_thread(self.store.queue_depth) >= self.max_depth:
+            await self._refresh()
+            raise QueueFull(self._retry_after())
+
+    async def submit(self, job_id: str, inputs: Dict[str, Any]):
+        await self.check_capacity()
+        await asyncio.to_thread(self.store.enqueue, job_id, inputs)
+
+    def cancel(self, job_id: str) -> bool:
+        # The job is already marked cancelled in the store: queued jobs are no longer
+        # claimable and the worker running it stops at its next heartbeat
+        return True
+
+    async def _refresh(self):
+        # Worker count and run time estimates are kept from the last refresh, so that
+        # _retry_after (also used for the in-process stream slots) never touches the store
+        stats = await asyncio.to_thread(self.store.queue_stats)
+        self.workers = max(1, stats["running"])
+        if stats["avg_duration"]:
+            self.avg_duration = stats["avg_duration"]
+        return stats
+
+    async def position(self, job_id: str) -> Optional[Dict[str, Any]]:
+        position = await asyncio.to_thread(self.store.queue_position, job_id)
+        if position is None:
+            return None
+        stats = await self._refresh()
+        # The number of remote workers isn't known here; assume the busy ones are all there are
+        wait = math.ceil(position / self.workers) * self.avg_duration if stats["running"] else 0.0
+        return self._eta(position, wait)
+
+    async def stats(self) -> Dict[str, Any]:
+        stats = await self._refresh()
+        waiting = await asyncio.to_thread(self.store.queue_depth)
+        return dict(await super().stats(), waiting=waiting, running=stats["running"])
+
+def create_research_queue(executor: Optional[str] = None) -> ResearchQueue:
+    executor = executor or RESEARCH_EXECUTOR
+    if executor == "remote":
+        from server.job_manager import job_manager
+        from server.job_store import SqliteJobStore
+        if not isinstance(job_manager.store, SqliteJobStore):
+            raise ValueError("RESEARCH_EXECUTOR=remote requires JOB_STORE=sqlite (shared with the workers)")
+        return SharedResearchQueue(job_manager.store)
+    if executor == "local":
+        return ResearchQueue()
+    raise ValueError(f"Unknown RESEARCH_EXECUTOR: {executor}")
+
+# Global instance
+research_queue = create_research_queue()
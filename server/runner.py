@@ -0,0 +1,58 @@
+import time
+import asyncio
+from typing import Dict, Any
+
+from agent.graph import create_graph
+from agent.utils.usage import UsageTracker, track_usage
+from agent.utils.deadline import hard_timeout
+from server.job_manager import job_manager, JobStatus
+
+# Initialize the graph (shared by the API process and out-of-process workers)
+graph = create_graph()
+
+async def run_research_background(job_id: str, inputs: Dict[str, Any]):
+    """
+    Executes the research graph in the background and updates job status.
+    Job store calls run in a thread: a shared SQLite store may wait on another process's lock.
+    """
+    tracker = UsageTracker()
+    if inputs.get("timeout"):
+        # Time spent waiting in the queue doesn't count: the deadline starts with the run
+        inputs = dict(inputs, deadline=time.time() + inputs["timeout"])
+    try:
+        await asyncio.to_thread(job_manager.update_job, job_id, JobStatus.IN_PROGRESS)
+        
+        # Invoke the graph (await the result); a run far past its deadline is cut off
+        with track_usage(tracker):
+            async with asyncio.timeout(hard_timeout(inputs.get("deadline"))):
+                result = await graph.ainvoke(inputs, config={"callbacks": [tracker]})
+        
+        # The result typically contains the 'report' key or the final state
+        # We'll save the whole result for now, or just the report if preferred
+        final_report = result.get("report", "No report generated")
+        
+        job = await asyncio.to_thread(job_manager.get_job, job_id)
+        if job is not None and job["status"] == JobStatus.CANCELLED:
+            # Cancelled just before the run finished: the result is discarded
+            print(f"--- Job {job_id} cancelled, discarding its result ---")
+            await asyncio.to_thread(job_manager.update_job, job_id, JobStatus.CANCELLED, usage=tracker.summary())
+            return
+        await asyncio.to_thread(job_manager.update_job, job_id, JobStatus.COMPLETED, result={"report": final_report}, usage=tracker.summary())
+        
+    except asyncio.CancelledError:
+        # In-flight fetches and LLM calls are cancelled with the graph
+        job = await asyncio.to_thread(job_manager.get_job, job_id)
+        if job is not None and job["status"] == JobStatus.CANCELLED: # DELETE /jobs/{id}
+            print(f"--- Job {job_id} cancelled ---")
+            await asyncio.to_thread(job_manager.update_job, job_id, JobStatus.CANCELLED, usage=tracker.summary())
+        else: # Shutdown: the caller decides what happens to the job
+            print(f"--- Job {job_id} interrupted ---")
+        raise
+
+    except TimeoutError:
+        print(f"Job {job_id} exceeded its deadline")
+        await asyncio.to_thread(job_manager.update_job, job_id, JobStatus.FAILED, error="Deadline exceeded", usage=tracker.summary())
+
+    except Exception as e:
+        print(f"Error processing job {job_id}: {e}")
+        await asyncio.to_thread(job_manager.update_job, job_id, JobStatus.FAILED, error=str(e), usage=tracker.summary())
@@ -0,0 +1,106 @@
+"""
+Out-of-process research worker.
+
+Claims async-mode jobs from the shared SQLite job store (JOB_STORE=sqlite, same JOB_DB_PATH
+as the API), runs the research graph and writes status, result and usage back to the store.
+Run any number of these next to API replicas started with RESEARCH_EXECUTOR=remote:
+
+    JOB_STORE=sqlite python -m server.worker --workers 4
+"""
+import os
+import sys
+import uuid
+import socket
+import asyncio
+import argparse
+from pathlib import Path
+
+# Add project root to python path to allow importing from agent
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from dotenv import load_dotenv
+
+# Load env variables (before the imports below read their settings)
+load_dotenv()
+
+from agent.utils.http_client import init_http_session, close_http_session
+from agent.utils.llm import warm_up_llms
+from server.job_manager import job_manager
+from server.job_store import SqliteJobStore, JOB_CLAIM_TIMEOUT
+from server.research_queue import RESEARCH_WORKERS
+from server.runner import run_research_background
+
+# Seconds between queue polls when there is nothing to claim
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1"))
+# Seconds between heartbeats of a running job (also how quickly a cancellation is noticed)
+WORKER_HEARTBEAT_INTERVAL = min(float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "2")), JOB_CLAIM_TIMEOUT / 4)
+
+async def heartbeat(store: SqliteJobStore, job_id: str, worker_id: str, run: asyncio.Task):
+    """
+    Keep the claim alive while the job runs; a crashed worker's jobs are reclaimed
+    by others once JOB_CLAIM_TIMEOUT passes without a heartbeat.
+    A job cancelled through the API (DELETE /jobs/{id}) is cancelled here.
+    """
+    while True:
+        await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+        if await asyncio.to_thread(store.heartbeat, job_id, worker_id):
+            continue
+        job = await asyncio.to_thread(store.get, job_id)
+        if job is not None and job["status"] == "cancelled":
+            print(f"--- Worker {worker_id}: job {job_id} cancelled ---")
+            run.cancel()
+        else:
+            # Reclaimed by another worker after a stall: let this run finish, stop renewing
+            print(f"--- Worker {worker_id}: lost claim on job {job_id} ---")
+        return
+
+async def worker_loop(store: SqliteJobStore, worker_id: str):
+    # Store calls go through a thread: with API replicas and other workers on the same
+    # SQLite file they can wait on its lock, which must not stall the jobs on this loop
+    while True:
+        claim = await asyncio.to_thread(store.claim, worker_id)
+        if claim is None:
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+            continue
+        job_id, inputs = claim
+        print(f"--- Worker {worker_id}: running job {job_id} ---")
+        run = asyncio.create_task(run_research_background(job_id, inputs))
+        beat = asyncio.create_task(heartbeat(store, job_id, worker_id, run))
+        try:
+            await asyncio.wait([run]) # A cancelled job doesn't stop the loop
+        finally:
+            beat.cancel()
+            if not run.done():
+                # The worker itself is being stopped: hand the job to another worker
+                run.cancel()
+                await asyncio.wait([run])
+                await asyncio.to_thread(store.release, job_id, worker_id)
+                print(f"--- Worker {worker_id}: released job {job_id} ---")
+
+async def run_workers(count: int):
+    store = job_manager.store
+    if not isinstance(store, SqliteJobStore):
+        raise SystemExit("server.worker needs the shared job store: set JOB_STORE=sqlite (and the API's JOB_DB_PATH)")
+
+    await init_http_session()
+    await warm_up_llms()
+    prefix = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    print(f"--- Worker: {count} research workers on {store.path} ---")
+    try:
+        await asyncio.gather(*(worker_loop(store, f"{prefix}-{i}") for i in range(count)))
+    finally:
+        await close_http_session()
+
+def main():
+    parser = argparse.ArgumentParser(description="Research job worker")
+    parser.add_argument("--workers", type=int, default=RESEARCH_WORKERS, help="Concurrent research runs in this process")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_workers(max(1, args.workers)))
+    except KeyboardInterrupt:
+        # Running jobs have been put back in the queue; a crashed worker's are reclaimed after JOB_CLAIM_TIMEOUT
+        print("--- Worker: stopped ---")
+
+if __name__ == "__main__":
+    main()